@@ -0,0 +1,119 @@
+"""
+Meal recommendations for many users in one request (POST /recommend-meals/batch).
+
+User IDs are handled in chunks of RECOMMEND_BATCH_CHUNK. For each chunk,
+load_readings() runs one grouped query per source the current rules
+actually use (labs, BP, sleep), plus one for today's step totals.
+rule_engine.RuleEngine then turns them into a modifier per user. Modifiers
+only take a few distinct values, so the users x meals product is computed
+once per distinct row (MealCatalog.adjusted_meals_json) and shared by every
+user with that modifier. Each user becomes one NDJSON line, in the same
+shape as GET /recommend-meals/{user_id}, so memory stays at one chunk.
+"""
+import json
+import os
+from datetime import date
+
+import numpy as np
+from sqlalchemy import func
+
+import meal_catalog
+import rule_engine
+from models import ActivityLog, BpReading, FutureLabInput, LabResult, SleepLog
+
+CHUNK_SIZE = int(os.getenv("RECOMMEND_BATCH_CHUNK", "2000"))
+
+# Rule inputs read from their own tables; every other input comes from lab_results
+READING_COLUMNS = {
+    "systolic": BpReading.systolic,
+    "diastolic": BpReading.diastolic,
+    "sleep_hours": SleepLog.duration,
+}
+# Lab results whose future_lab_inputs entry is a glucose test in mg/dL (the
+# unit of the default diabetic threshold) also count as glucose_value readings.
+# Other labs (HbA1c %, lipids, ...) only feed their own field.
+GLUCOSE_INPUT = "glucose_value"
+GLUCOSE_UNIT = "mg/dl"
+
+
+def _test_key(test_type) -> str:
+    """future_lab_inputs names carry a unit ("Fasting Glucose (mg/dL)"); lab rows may not."""
+    return (test_type or "").split(" (")[0].strip().lower()
+
+
+def _is_glucose_lab(test_type, unit) -> bool:
+    return "glucose" in _test_key(test_type) and (unit or "").strip().lower() == GLUCOSE_UNIT
+
+
+def load_readings(db, user_ids: list, engine):
+    """
+    (readings, total_steps) for user_ids, in the shape RuleEngine.modifiers()
+    takes: readings maps each input the rules use to (highest, lowest)
+    arrays aligned with user_ids. Takes a sync Session; async callers go
+    through AsyncSession.run_sync.
+    """
+    uniq, row_of = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    ids = uniq.tolist()
+    readings = {}
+
+    def fold(input_name, rows):
+        if input_name not in engine.inputs or not rows:
+            return
+        highest, lowest = readings.setdefault(input_name, (np.full(len(uniq), np.nan), np.full(len(uniq), np.nan)))
+        u, hi, lo = (np.array(col, dtype=np.float64) for col in zip(*rows))
+        ix = np.searchsorted(uniq, u)
+        np.fmax.at(highest, ix, hi)     # fmax/fmin skip NaN (users without readings)
+        np.fmin.at(lowest, ix, lo)
+
+    lab_inputs = [i for i in engine.inputs if i not in READING_COLUMNS]
+    if lab_inputs:
+        lab_catalog = db.query(FutureLabInput.test_type, FutureLabInput.unit,
+                               FutureLabInput.database_field_name).all()
+        glucose_fields = ({field for test_type, unit, field in lab_catalog if _is_glucose_lab(test_type, unit)}
+                          if GLUCOSE_INPUT in lab_inputs else set())
+        fields = set(lab_inputs) | glucose_fields
+        field_of = {_test_key(test_type): field for test_type, _, field in lab_catalog if field in fields}
+        rows = (db.query(LabResult.user_id, LabResult.test_type, func.max(LabResult.value), func.min(LabResult.value))
+                .filter(LabResult.user_id.in_(ids), LabResult.value.isnot(None))
+                .group_by(LabResult.user_id, LabResult.test_type).all())
+        by_field = {}
+        for u, test_type, hi, lo in rows:
+            field = field_of.get(_test_key(test_type))
+            if field:
+                by_field.setdefault(field, []).append((u, hi, lo))
+        for field, field_rows in by_field.items():
+            fold(field, field_rows)
+            if field in glucose_fields:
+                fold(GLUCOSE_INPUT, field_rows)
+
+    for input_name, column in READING_COLUMNS.items():
+        if input_name in engine.inputs:
+            user_col = column.class_.user_id
+            fold(input_name, db.query(user_col, func.max(column), func.min(column))
+                 .filter(user_col.in_(ids), column.isnot(None)).group_by(user_col).all())
+
+    today = date.today().isoformat()
+    steps = dict(db.query(ActivityLog.user_id, func.sum(ActivityLog.steps))
+                 .filter(ActivityLog.user_id.in_(ids), ActivityLog.timestamp.startswith(today))
+                 .group_by(ActivityLog.user_id).all())
+    total_steps = np.array([steps.get(u) or 0 for u in ids], dtype=np.int64)
+
+    return {k: (hi[row_of], lo[row_of]) for k, (hi, lo) in readings.items()}, total_steps[row_of]
+
+
+async def stream_recommendations(session_factory, user_ids: list, category: str = None):
+    """Yield one NDJSON line per user. Opens and closes its own AsyncSession."""
+    catalog = meal_catalog.store.current()     # one catalog and rule set for the whole stream
+    engine = rule_engine.current()
+    async with session_factory() as db:
+        for start in range(0, len(user_ids), CHUNK_SIZE):
+            chunk = user_ids[start:start + CHUNK_SIZE]
+            readings, total_steps = await db.run_sync(load_readings, chunk, engine)
+            distinct, row_of = np.unique(engine.modifiers(readings, total_steps), return_inverse=True)
+            rows = [catalog.adjusted_meals_json(float(m), category) for m in distinct]
+
+            prefix = '"catalog_version": ' + json.dumps(catalog.version)
+            yield "".join(
+                f'{{"user_id": {u}, "total_steps": {s}, {prefix}, "meals": {rows[r]}}}\n'
+                for u, s, r in zip(chunk, total_steps.tolist(), row_of.tolist())
+            )
@@ -0,0 +1,137 @@
+"""
+Concurrent benchmark for the NutritionApp API.
+
+Drives the ASGI app in-process with httpx (no server needed): --concurrency
+clients share --requests calls of the chosen mix and the script reports
+throughput and p50/p95/p99 latency per endpoint. Sync handlers run in
+Starlette's threadpool exactly as under uvicorn, so pointing --app-dir at an
+older checkout compares the threadpool/SessionLocal implementation against
+the async one:
+
+    python bench_api.py --concurrency 50 --requests 4000
+    git worktree add /tmp/nutri-sync <commit> && \\
+        python bench_api.py --app-dir /tmp/nutri-sync/NutritionApp_POC --out sync.json
+
+Each run works on a scratch copy of the app's spike_poc.db. The async app
+needs the packages in requirements.txt (aiosqlite and greenlet included).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERS = 200
+
+
+def load_app(app_dir: str):
+    """Import main.py from app_dir, with the working directory on a copy of its database."""
+    scratch = tempfile.mkdtemp(prefix="bench_api_")
+    if os.path.exists(os.path.join(app_dir, "spike_poc.db")):
+        shutil.copy(os.path.join(app_dir, "spike_poc.db"), scratch)
+    os.chdir(scratch)
+    sys.path.insert(0, app_dir)
+    import main
+    return main.app, scratch
+
+
+def summary(samples, elapsed: float):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"requests": len(samples), "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(cuts[49], 2), "p95_ms": round(cuts[94], 2), "p99_ms": round(cuts[98], 2)}
+
+
+def make_calls(mix: str, count: int):
+    """(label, method, path, json body) per request, the same sequence for every run."""
+    rng = random.Random(42)
+    base_id = int(time.time() * 1000) % 1_000_000_000 * 1000     # fresh primary keys per run
+    calls = []
+    for i in range(count):
+        write = mix == "write" or (mix == "mixed" and rng.random() < 0.3)
+        uid = rng.randint(1, USERS)
+        if write:
+            calls.append(("POST /glucose/", "POST", "/glucose/", {
+                "reading_id": base_id + i, "user_id": uid, "timestamp": datetime.now().isoformat(),
+                "glucose_value": round(rng.uniform(60, 200), 1), "source": "bench"}))
+        else:
+            calls.append(("GET /recommend-meals/{id}", "GET", f"/recommend-meals/{uid}", None))
+    return calls
+
+
+async def seed(client):
+    """Today's activity and one lab value for every benchmark user."""
+    now = datetime.now().isoformat()
+    base_id = int(time.time() * 1000) % 1_000_000_000 * 1000 + 900
+    for uid in range(1, USERS + 1):
+        await client.post("/activity/", json={"activity_id": base_id + uid, "user_id": uid,
+                                              "steps": 3000 + uid * 40, "heart_rate": 80, "duration": 30,
+                                              "timestamp": now})
+        await client.post("/lab_result/", json={"lab_id": base_id + uid, "user_id": uid, "test_type": "HbA1c",
+                                                "value": 50 + uid % 60, "date": now})
+
+
+async def run(app, calls, concurrency: int):
+    latencies, errors = defaultdict(list), defaultdict(int)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await seed(client)
+            queue = iter(calls)
+
+            async def worker():
+                for label, method, path, body in queue:
+                    started = time.perf_counter()
+                    try:
+                        status = (await client.request(method, path, json=body)).status_code
+                    except Exception:
+                        status = None
+                    latencies[label].append((time.perf_counter() - started) * 1000)
+                    if status is None or status >= 400:
+                        errors[label] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    report = {label: dict(summary(s, elapsed), errors=errors[label]) for label, s in latencies.items()}
+    every = [ms for s in latencies.values() for ms in s]
+    report["ALL"] = dict(summary(every, elapsed), errors=sum(errors.values()))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent in-process benchmark of the NutritionApp API.")
+    parser.add_argument("--app-dir", default=HERE, help="directory holding the main.py to benchmark")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mix", choices=("read", "write", "mixed"), default="mixed")
+    parser.add_argument("--out", default=None, help="also write the report as JSON")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None     # load_app changes the working directory
+
+    app, scratch = load_app(os.path.abspath(args.app_dir))
+    try:
+        report = asyncio.run(run(app, make_calls(args.mix, args.requests), args.concurrency))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"\n{args.app_dir}: {args.requests} {args.mix} requests, concurrency {args.concurrency}")
+    print(f"{'endpoint':<28}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, r in report.items():
+        print(f"{label:<28}{r['requests']:>7}{r['errors']:>8}{r['rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.out}")
@@ -0,0 +1,232 @@
+"""
+Bulk ingestion for glucose readings, activity logs and lab results.
+
+The POST /<kind>/bulk endpoints accept either a JSON array of records or
+NDJSON (one record per line), picked from the first byte of the body. The
+body is parsed as it streams in, so only the current network chunk and the
+current batch of BULK_CHUNK_SIZE records are ever held in memory.
+
+Each batch is validated record by record with the same Pydantic schemas as
+the single-record endpoints. The valid rows are written with one Core
+executemany INSERT in their own transaction. If that INSERT fails, e.g. on
+a duplicate id, only that batch is rolled back and counted as rejected. The
+response has the total accepted/rejected counts and, for the first
+MAX_CHUNKS_IN_SUMMARY batches, per-batch counts and the first few errors.
+"""
+import codecs
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+
+CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+MAX_RECORD_BYTES = int(os.getenv("BULK_MAX_RECORD_BYTES", str(1 << 20)))
+MAX_ERRORS_PER_CHUNK = 10
+MAX_CHUNKS_IN_SUMMARY = 20
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class BodyError(ValueError):
+    """The upload is not a JSON array or NDJSON and parsing cannot continue."""
+
+
+class BadRecord:
+    """Stands in for an NDJSON line that is not valid JSON; counted as rejected."""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _over_limit(text: str, start: int = 0) -> bool:
+    """True if text[start:] is longer than MAX_RECORD_BYTES once UTF-8 encoded."""
+    chars = len(text) - start
+    if chars > MAX_RECORD_BYTES:
+        return True
+    if chars * 4 <= MAX_RECORD_BYTES:     # at most 4 bytes per character
+        return False
+    return len(text[start:].encode("utf-8")) > MAX_RECORD_BYTES
+
+
+def _parse_line(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return BadRecord(f"invalid JSON: {e}")
+
+
+async def iter_records(stream):
+    """Yield the records of a JSON array or NDJSON byte stream as they arrive."""
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    decoder = json.JSONDecoder()
+    chunks = stream.__aiter__()
+    buf, mode, done = "", None, False
+    state = "first"         # JSON array: first, value, separator, closed
+
+    while True:
+        if mode is None:
+            head = buf.lstrip()
+            if head:
+                mode = "array" if head[0] == "[" else "ndjson"
+                buf = head[1:] if mode == "array" else head
+                continue
+
+        elif mode == "ndjson":
+            lines = buf.split("\n")
+            buf = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+            if done:
+                if buf.strip():
+                    yield _parse_line(buf)
+                return
+            if _over_limit(buf):
+                raise BodyError(f"NDJSON line longer than {MAX_RECORD_BYTES} bytes")
+
+        else:
+            pos = 0     # read offset; buf is trimmed once per network chunk, not per record
+            while True:
+                i = _WHITESPACE.match(buf, pos).end()
+                if i == len(buf):
+                    pos = i
+                    break
+                c = buf[i]
+                if state == "closed":
+                    raise BodyError("unexpected data after the JSON array")
+                if state == "separator" or (state == "first" and c == "]"):
+                    if c == "]":
+                        state = "closed"
+                    elif c != ",":
+                        raise BodyError(f"expected ',' or ']' in JSON array, got {c!r}")
+                    else:
+                        state = "value"
+                    pos = i + 1
+                    continue
+                try:
+                    record, end = decoder.raw_decode(buf, i)
+                except json.JSONDecodeError as e:
+                    if done:
+                        raise BodyError(f"invalid JSON in array: {e}")
+                    end = None
+                if end is None or (end == len(buf) and not done):
+                    # Incomplete record (or a number that may continue): wait for more bytes
+                    if _over_limit(buf, i):
+                        raise BodyError(f"JSON array element longer than {MAX_RECORD_BYTES} bytes")
+                    pos = i
+                    break
+                yield record
+                pos = end
+                state = "separator"
+            buf = buf[pos:]
+            if done:
+                if mode == "array" and state != "closed":
+                    raise BodyError("unterminated JSON array")
+                return
+
+        if done:
+            return      # empty body
+        try:
+            buf += utf8.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buf += utf8.decode(b"", final=True)
+            done = True
+
+
+async def _flush(db, table, rows: list, stats: dict):
+    if rows:
+        try:
+            await db.execute(insert(table), rows)
+            await db.commit()
+            stats["accepted"] += len(rows)
+        except DBAPIError as e:
+            await db.rollback()
+            stats["rejected"] += len(rows)
+            stats["errors"].append({"error": f"batch rolled back: {e.orig}"})
+
+
+async def ingest(db, records, schema, table, to_row):
+    """
+    Validate and insert an async iterable of raw records, CHUNK_SIZE at a time.
+    Returns the summary sent back to the client.
+    """
+    summary = {"records": 0, "accepted": 0, "rejected": 0, "chunk_count": 0, "chunks": []}
+    rows = []
+    stats = {"chunk": 0, "accepted": 0, "rejected": 0, "errors": []}
+    index = 0
+    error = None
+
+    def close_chunk(stats):
+        summary["accepted"] += stats["accepted"]
+        summary["rejected"] += stats["rejected"]
+        summary["chunk_count"] += 1
+        if len(summary["chunks"]) < MAX_CHUNKS_IN_SUMMARY:
+            summary["chunks"].append(stats)
+
+    try:
+        async for record in records:
+            try:
+                if isinstance(record, BadRecord):
+                    raise ValueError(record.error)
+                rows.append(to_row(schema.model_validate(record)))
+            except (ValidationError, ValueError) as e:
+                stats["rejected"] += 1
+                if len(stats["errors"]) < MAX_ERRORS_PER_CHUNK:
+                    msg = "; ".join(f"{'.'.join(map(str, d['loc']))}: {d['msg']}" for d in e.errors()) \
+                        if isinstance(e, ValidationError) else str(e)
+                    stats["errors"].append({"index": index, "error": msg})
+            index += 1
+
+            if len(rows) + stats["rejected"] >= CHUNK_SIZE:
+                await _flush(db, table, rows, stats)
+                close_chunk(stats)
+                rows, stats = [], {"chunk": stats["chunk"] + 1, "accepted": 0, "rejected": 0, "errors": []}
+    except BodyError as e:
+        error = str(e)
+
+    await _flush(db, table, rows, stats)
+    if stats["accepted"] or stats["rejected"]:
+        close_chunk(stats)
+
+    summary["records"] = index
+    if error:
+        summary["error"] = error    # batches before this point are already committed
+    return summary
+
+
+# Row builders, shared with the single-record endpoints so both apply the same defaults
+
+def glucose_row(reading) -> dict:
+    return {
+        "reading_id": reading.reading_id,
+        "user_id": reading.user_id,
+        "timestamp": reading.timestamp or datetime.now(timezone.utc),
+        "glucose_value": reading.glucose_value,
+        "source": reading.source or "Unknown",
+    }
+
+
+def activity_row(log) -> dict:
+    return {
+        "activity_id": log.activity_id,
+        "user_id": log.user_id,
+        "steps": log.steps,
+        "heart_rate": log.heart_rate,
+        "duration": log.duration,
+        "timestamp": log.timestamp or datetime.now(timezone.utc),
+    }
+
+
+def lab_row(lab) -> dict:
+    return {
+        "lab_id": lab.lab_id,
+        "user_id": lab.user_id,
+        "test_type": lab.test_type or "Unknown",
+        "value": lab.value,
+        "unit": lab.unit or "Unknown",
+        "date": lab.date or datetime.now(timezone.utc),
+        "source": lab.source or "Unknown",
+    }
@@ -1,11 +1,27 @@
+import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = "sqlite:///spike_poc.db"  # Use three slashes for relative path
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///spike_poc.db"  # same file, for the async handlers
 
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Async engine used by the API handlers. Each pooled connection is one
+# aiosqlite thread; sqlite still serializes writers, so extra connections
+# mostly help concurrent readers. pool_timeout bounds the wait for a free
+# connection under load instead of letting requests queue forever.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),  # seconds
+    connect_args={"timeout": float(os.getenv("DB_BUSY_TIMEOUT", "5"))},  # seconds to wait on a locked db
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -1,26 +1,37 @@
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
-from database import Base, engine, SessionLocal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Base, AsyncSessionLocal, async_engine
 from models import User, Device, GlucoseReading, ActivityLog, LabResult
-from schemas import UserSchema, DeviceSchema, GlucoseReadingSchema, ActivityLogSchema, LabResultSchema
-from datetime import datetime
-from fastapi.responses import JSONResponse
-from rule_engine import adjust_meals_for_user
-import json
+from schemas import UserSchema, DeviceSchema, GlucoseReadingSchema, ActivityLogSchema, LabResultSchema, BatchRecommendRequest
+from fastapi.responses import JSONResponse, StreamingResponse
+import rule_engine
+from typing import Optional
+import meal_catalog
+import batch_recommend
+import bulk_ingest
 
-app = FastAPI()
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables, meal catalog and carb rules are ready before the first request
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    meal_catalog.store.current()
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(rule_engine.load)
+    yield
+    await async_engine.dispose()
 
 
-# Dependency to get DB session
+app = FastAPI(lifespan=lifespan)
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+# Dependency to get DB session; closed (and rolled back if uncommitted) even when the handler raises
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @app.get("/")
@@ -28,36 +39,35 @@ def root():
     return {"message": "NutritionApp API is running"}
 
 
-@app.get("/recommend-meals/{user_id}")
-def recommend_meals(user_id: int):
-    db: Session = SessionLocal()
-
-    # Get lab results (HbA1c) for user
-    labs = db.query(LabResult).filter(LabResult.user_id == user_id).all()
-    lab_data = [{"test_type": l.test_type, "value": l.value} for l in labs]
+@app.post("/recommend-meals/batch")
+async def recommend_meals_batch(req: BatchRecommendRequest):
+    # NDJSON, one line per user in request order; the stream manages its own session
+    return StreamingResponse(
+        batch_recommend.stream_recommendations(AsyncSessionLocal, req.user_ids, req.category),
+        media_type="application/x-ndjson",
+    )
 
-    # Get total steps from today's activity log
-    from datetime import date
-    today = date.today().isoformat()
 
-    steps_data = db.query(ActivityLog).filter(
-        ActivityLog.user_id == user_id,
-        ActivityLog.timestamp.startswith(today)
-    ).all()
+@app.get("/recommend-meals/{user_id}")
+async def recommend_meals(user_id: int, category: Optional[str] = None, db: AsyncSession = Depends(get_db)):
 
-    total_steps = sum([a.steps or 0 for a in steps_data])
+    # Labs/BP/sleep the rules need, and today's step total (same loader as the batch endpoint)
+    engine = rule_engine.current()
+    readings, steps = await db.run_sync(batch_recommend.load_readings, [user_id], engine)
+    total_steps = int(steps[0])
 
-    # Load meals.json (mock catalog)
-    with open("meals.json", "r") as f:
-        meal_catalog = json.load(f)
+    # Preloaded catalog; reloaded only when meals.json changes
+    catalog = meal_catalog.store.current()
 
     # Adjust meals using rule engine
-    result = adjust_meals_for_user(lab_data, total_steps, meal_catalog)
-    return {"user_id": user_id, "total_steps": total_steps, "meals": result}
+    result = catalog.adjusted_meals(float(engine.modifiers(readings, steps)[0]), category)
+    # Plain JSON already; JSONResponse skips FastAPI's per-field encoding of large catalogs
+    return JSONResponse({"user_id": user_id, "total_steps": total_steps,
+                         "catalog_version": catalog.version, "meals": result})
 
 
 @app.post("/users/", response_model=UserSchema)
-def create_user(user: UserSchema, db: Session = Depends(get_db)):
+async def create_user(user: UserSchema, db: AsyncSession = Depends(get_db)):
     db_user = User(
         user_id=user.user_id,
         name=user.name or "Unknown",
@@ -67,13 +77,13 @@ def create_user(user: UserSchema, db: Session = Depends(get_db)):
         goal=user.goal or "Unknown"
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @app.post("/devices/", response_model=DeviceSchema)
-def create_device(device: DeviceSchema, db: Session = Depends(get_db)):
+async def create_device(device: DeviceSchema, db: AsyncSession = Depends(get_db)):
     db_device = Device(
         device_id=device.device_id,
         user_id=device.user_id,
@@ -82,53 +92,54 @@ def create_device(device: DeviceSchema, db: Session = Depends(get_db)):
         start_date=device.start_date
     )
     db.add(db_device)
-    db.commit()
-    db.refresh(db_device)
+    await db.commit()
+    await db.refresh(db_device)
     return db_device
 
 
 @app.post("/glucose/", response_model=GlucoseReadingSchema)
-def create_glucose_reading(reading: GlucoseReadingSchema, db: Session = Depends(get_db)):
-    db_reading = GlucoseReading(
-        reading_id=reading.reading_id,
-        user_id=reading.user_id,
-        timestamp=reading.timestamp or datetime.utcnow(),
-        glucose_value=reading.glucose_value,
-        source=reading.source or "Unknown"
-    )
+async def create_glucose_reading(reading: GlucoseReadingSchema, db: AsyncSession = Depends(get_db)):
+    db_reading = GlucoseReading(**bulk_ingest.glucose_row(reading))
     db.add(db_reading)
-    db.commit()
-    db.refresh(db_reading)
+    await db.commit()
+    await db.refresh(db_reading)
     return db_reading
 
 
 @app.post("/activity/", response_model=ActivityLogSchema)
-def create_activity_log(log: ActivityLogSchema, db: Session = Depends(get_db)):
-    db_log = ActivityLog(
-        activity_id=log.activity_id,
-        user_id=log.user_id,
-        steps=log.steps,
-        heart_rate=log.heart_rate,
-        duration=log.duration,
-        timestamp=log.timestamp or datetime.utcnow()
-    )
+async def create_activity_log(log: ActivityLogSchema, db: AsyncSession = Depends(get_db)):
+    db_log = ActivityLog(**bulk_ingest.activity_row(log))
     db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    await db.commit()
+    await db.refresh(db_log)
     return db_log
 
 @app.post("/lab_result/", response_model=LabResultSchema)
-def create_lab_result(lab: LabResultSchema, db: Session = Depends(get_db)):
-    db_lab = LabResult(
-        lab_id=lab.lab_id,
-        user_id=lab.user_id,
-        test_type=lab.test_type or "Unknown",
-        value=lab.value,
-        unit=lab.unit or "Unknown",
-        date=lab.date or datetime.utcnow(),
-        source=lab.source or "Unknown"
-    )
+async def create_lab_result(lab: LabResultSchema, db: AsyncSession = Depends(get_db)):
+    db_lab = LabResult(**bulk_ingest.lab_row(lab))
     db.add(db_lab)
-    db.commit()
-    db.refresh(db_lab)
+    await db.commit()
+    await db.refresh(db_lab)
     return db_lab
+
+
+# Bulk uploads: a JSON array or NDJSON body, validated and inserted in chunks (see bulk_ingest.py)
+
+async def _bulk(request: Request, db: AsyncSession, schema, model, to_row):
+    summary = await bulk_ingest.ingest(db, bulk_ingest.iter_records(request.stream()), schema, model.__table__, to_row)
+    return JSONResponse(summary, status_code=400 if "error" in summary else 200)
+
+
+@app.post("/glucose/bulk")
+async def create_glucose_readings_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    return await _bulk(request, db, GlucoseReadingSchema, GlucoseReading, bulk_ingest.glucose_row)
+
+
+@app.post("/activity/bulk")
+async def create_activity_logs_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    return await _bulk(request, db, ActivityLogSchema, ActivityLog, bulk_ingest.activity_row)
+
+
+@app.post("/lab_result/bulk")
+async def create_lab_results_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    return await _bulk(request, db, LabResultSchema, LabResult, bulk_ingest.lab_row)
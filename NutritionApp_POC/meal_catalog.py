@@ -0,0 +1,143 @@
+"""
+In-memory meal catalog for /recommend-meals.
+
+The catalog file is parsed once into a MealCatalog: carbs as a float array
+plus name and category indexes, tagged with a version (the first 12 hex
+digits of the file's sha256). CatalogStore.current() stats the file at most
+every MEAL_CATALOG_CHECK_SECONDS. It re-reads the file only when mtime or
+size changed and re-parses it only when the hash changed. The swap is a
+single reference assignment, so a request always sees one whole catalog.
+If the new file cannot be parsed, the old catalog stays in place.
+
+MEAL_CATALOG_PATH overrides the default meals.json next to this module, so
+the service does not depend on the working directory.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meals.json")
+DEFAULT_CATEGORY = "uncategorized"
+_NO_MATCH = object()    # cache key shared by every category not in the catalog
+
+
+class MealCatalog:
+    def __init__(self, meals: list, version: str):
+        self.version = version
+        self.names = [m["name"] for m in meals]
+        self.raw_carbs = [m["carbs"] for m in meals]      # as written in the file (int or float)
+        self.carbs = np.array(self.raw_carbs, dtype=np.float64)
+        self.categories = [m.get("category", DEFAULT_CATEGORY) for m in meals]
+        self.by_name = {name: i for i, name in enumerate(self.names)}
+        by_category = {}
+        for i, category in enumerate(self.categories):
+            by_category.setdefault(category, []).append(i)
+        self.by_category = {c: np.array(ix, dtype=np.intp) for c, ix in by_category.items()}
+        self._adjusted = {}     # (modifier, category) -> meal list; a catalog is immutable
+        self._adjusted_json = {}
+        self._adjusted_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def indices(self, category: str = None):
+        """Row indices for one category (all rows when category is None)."""
+        if category is None:
+            return np.arange(len(self.names))
+        return self.by_category.get(category, np.array([], dtype=np.intp))
+
+    def _cache_key(self, modifier: float, category: str = None):
+        # category comes from the query string: unknown ones all map to the
+        # same (empty) entry so callers cannot grow the caches without bound
+        if category is not None and category not in self.by_category:
+            category = _NO_MATCH
+        return modifier, category
+
+    def adjusted_meals(self, modifier: float, category: str = None) -> list:
+        """
+        Meals with carbs scaled by `modifier`, in the rule engine's output
+        shape. Only a handful of modifiers exist, so each list is built once
+        per catalog version and then shared between requests.
+        """
+        key = self._cache_key(modifier, category)
+        meals = self._adjusted.get(key)
+        if meals is None:
+            ix = self.indices(category)
+            scaled = (self.carbs[ix] * modifier).tolist()
+            # Python round() on the products, to match adjust_meals_for_user exactly
+            meals = [{"name": self.names[i], "original_carbs": self.raw_carbs[i],
+                      "adjusted_carbs": round(c, 1), "portion_size": modifier}
+                     for i, c in zip(ix.tolist(), scaled)]
+            with self._adjusted_lock:
+                meals = self._adjusted.setdefault(key, meals)
+        return meals
+
+    def adjusted_meals_json(self, modifier: float, category: str = None) -> str:
+        """adjusted_meals() already serialized, for streamed responses."""
+        key = self._cache_key(modifier, category)
+        text = self._adjusted_json.get(key)
+        if text is None:
+            text = self._adjusted_json.setdefault(key, json.dumps(self.adjusted_meals(modifier, category)))
+        return text
+
+
+def parse(raw: bytes) -> MealCatalog:
+    meals = json.loads(raw)
+    if not isinstance(meals, list):
+        raise ValueError("meal catalog must be a JSON list")
+    for m in meals:
+        # bool is an int subclass, so it is excluded explicitly
+        if (not isinstance(m, dict) or not isinstance(m.get("name"), str)
+                or not isinstance(m.get("carbs"), (int, float)) or isinstance(m["carbs"], bool)):
+            raise ValueError(f"bad meal entry: {m!r}")
+    return MealCatalog(meals, hashlib.sha256(raw).hexdigest()[:12])
+
+
+class CatalogStore:
+    def __init__(self, path: str = None, check_seconds: float = None):
+        self.path = path or os.getenv("MEAL_CATALOG_PATH") or DEFAULT_PATH
+        self.check_seconds = (float(os.getenv("MEAL_CATALOG_CHECK_SECONDS", "1"))
+                              if check_seconds is None else check_seconds)
+        self._catalog = None
+        self._stamp = None          # (mtime_ns, size) of the file behind _catalog
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> MealCatalog:
+        if self._catalog is None or time.monotonic() - self._checked_at >= self.check_seconds:
+            self._refresh()
+        return self._catalog
+
+    def _refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._catalog is not None and now - self._checked_at < self.check_seconds:
+                return      # another thread just checked
+            self._checked_at = now
+            stamp = None
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_mtime_ns, st.st_size)
+                if stamp == self._stamp:
+                    return
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                if self._catalog is not None and hashlib.sha256(raw).hexdigest()[:12] == self._catalog.version:
+                    self._stamp = stamp     # touched, not changed
+                    return
+                catalog = parse(raw)
+            except (OSError, ValueError) as e:
+                if self._catalog is None:
+                    raise
+                self._stamp = stamp         # warn once per bad version of the file
+                print(f"⚠️ Keeping meal catalog {self._catalog.version}; reload of {self.path} failed: {e}")
+                return
+            self._catalog, self._stamp = catalog, stamp
+            print(f"🍽️ Loaded meal catalog {catalog.version} ({len(catalog)} meals) from {self.path}")
+
+
+store = CatalogStore()
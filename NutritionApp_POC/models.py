@@ -77,6 +77,32 @@ class FutureLabInput(Base):
     database_field_name = Column(String, default="unknown")
 
 
+# Carb rules, compiled by rule_engine.RuleEngine
+class RuleCondition(Base):
+    __tablename__ = "rule_conditions"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    input_name = Column(String, nullable=False)  # glucose_value, systolic, sleep_hours or a future_lab_inputs.database_field_name
+    operator = Column(String, nullable=False)  # >, >=, <, <= against any reading
+    threshold = Column(Float, nullable=False)
+
+
+class ActivityLevel(Base):
+    __tablename__ = "activity_levels"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    min_steps = Column(Integer, nullable=False)
+
+
+class CarbRule(Base):
+    __tablename__ = "carb_rules"
+    id = Column(Integer, primary_key=True, index=True)
+    priority = Column(Integer, nullable=False)  # lowest matching priority wins
+    conditions = Column(String, default="")  # comma-separated rule_conditions names, all must hold
+    activity_level = Column(String, nullable=True)  # None = any level
+    modifier = Column(Float, nullable=False)
+
+
 class MoodLog(Base):
     __tablename__ = "mood_logs"
     mood_id = Column(Integer, primary_key=True, index=True)
@@ -1,47 +1,181 @@
-import json
+"""
+Data-driven carb rules.
+
+The rules live in three tables (models.RuleCondition, ActivityLevel, CarbRule):
+- a condition holds when any reading of one input (glucose_value from
+  glucose labs, systolic, sleep_hours, a future_lab_inputs.database_field_name,
+  ...) passes `operator threshold`;
+- activity levels are step bands starting at min_steps;
+- a carb rule needs all of its conditions and, optionally, one activity
+  level; the matching rule with the lowest priority sets the modifier.
+
+RuleEngine compiles them once into arrays. modifiers() scores any number of
+users in a handful of array operations, and meals are scaled once per
+distinct modifier (meal_catalog.MealCatalog.adjusted_meals), so more rules
+or a bigger catalog add no per-meal work.
+
+The DEFAULT_* tables are the original hardcoded rules (any reading > 80 is
+diabetic; low/moderate/high at 5000/10000 steps; 0.7/0.8/0.9 carbs) and seed
+empty tables. is_diabetic(), classify_activity(), get_carb_modifier() and
+adjust_meals_for_user() keep their signatures on top of the current engine.
+"""
+import numpy as np
+
+from meal_catalog import MealCatalog
+
+OPERATORS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+DEFAULT_CONDITIONS = [("diabetic", "glucose_value", ">", 80)]        # (name, input, operator, threshold)
+DEFAULT_LEVELS = [("low", 0), ("moderate", 5000), ("high", 10000)]  # (name, min_steps)
+DEFAULT_RULES = [                                                   # (priority, conditions, level, modifier)
+    (10, "diabetic", "low", 0.70),
+    (20, "diabetic", "moderate", 0.80),
+    (30, "diabetic", "high", 0.90),
+    (1000, "", None, 1.0),
+]
+
+
+class RuleEngine:
+    def __init__(self, conditions, levels, rules):
+        self.condition_names = [c[0] for c in conditions]
+        self.inputs = sorted({c[1] for c in conditions})
+        self._conditions = []       # (input, uses highest reading?, comparison, threshold)
+        for name, input_name, op, threshold in conditions:
+            if op not in OPERATORS:
+                raise ValueError(f"condition {name}: unknown operator {op!r}")
+            # "any reading > t" is "highest > t"; "any reading < t" is "lowest < t"
+            self._conditions.append((input_name, op.startswith(">"), OPERATORS[op], float(threshold)))
+
+        levels = sorted(levels, key=lambda lv: lv[1])
+        self.level_names = [lv[0] for lv in levels]
+        self._level_floors = np.array([lv[1] for lv in levels], dtype=np.float64)
+
+        rules = sorted(rules, key=lambda r: r[0])
+        self._required = np.zeros((len(rules), len(conditions)), dtype=np.int64)
+        self._rule_level = np.full(len(rules), -1, dtype=np.int64)
+        self._rule_modifier = np.array([float(r[3]) for r in rules])
+        for i, (priority, names, level, _) in enumerate(rules):
+            for name in filter(None, (n.strip() for n in (names or "").split(","))):
+                if name not in self.condition_names:
+                    raise ValueError(f"carb rule {priority}: unknown condition {name!r}")
+                self._required[i, self.condition_names.index(name)] = 1
+            if level is not None:
+                if level not in self.level_names:
+                    raise ValueError(f"carb rule {priority}: unknown activity level {level!r}")
+                self._rule_level[i] = self.level_names.index(level)
+        self._required_count = self._required.sum(axis=1)
+        if not ((self._required_count == 0) & (self._rule_level == -1)).any():
+            raise ValueError("carb rules need a catch-all rule (no conditions, any activity level)")
+
+    def conditions(self, readings: dict, n: int):
+        """
+        (n users x conditions) bool matrix. readings maps an input name to a
+        (highest, lowest) pair of per-user arrays, NaN where a user has none;
+        a missing input fails its conditions.
+        """
+        out = np.zeros((n, len(self._conditions)), dtype=bool)
+        for j, (input_name, use_highest, compare, threshold) in enumerate(self._conditions):
+            if input_name in readings:
+                highest, lowest = readings[input_name]
+                out[:, j] = compare(highest if use_highest else lowest, threshold)
+        return out
+
+    def levels(self, steps):
+        """Activity level index per user."""
+        ix = np.searchsorted(self._level_floors, np.asarray(steps, dtype=np.float64), side="right") - 1
+        return np.maximum(ix, 0)
+
+    def choose(self, met, level):
+        """Modifier of the first rule (by priority) each user matches."""
+        matches = (met.astype(np.int64) @ self._required.T) == self._required_count
+        matches &= (self._rule_level == -1) | (self._rule_level == level[:, None])
+        # The catch-all always matches, so argmax finds a rule for every user
+        return self._rule_modifier[matches.argmax(axis=1)]
+
+    def modifiers(self, readings: dict, steps):
+        """Carb modifier per user, for any number of users at once."""
+        steps = np.asarray(steps)
+        return self.choose(self.conditions(readings, len(steps)), self.levels(steps))
+
+    def readings_from_dicts(self, readings: list) -> dict:
+        """One user's readings, as dicts keyed by input name, in the shape modifiers() takes."""
+        out = {}
+        for input_name in self.inputs:
+            values = [r[input_name] for r in readings if r.get(input_name) is not None]
+            if values:
+                out[input_name] = (np.array([max(values)], dtype=np.float64),
+                                   np.array([min(values)], dtype=np.float64))
+        return out
+
+    def modifier_for(self, readings: list, steps: int) -> float:
+        return float(self.modifiers(self.readings_from_dicts(readings), [steps])[0])
+
+
+DEFAULT_ENGINE = RuleEngine(DEFAULT_CONDITIONS, DEFAULT_LEVELS, DEFAULT_RULES)
+_engine = None
+
+
+def current() -> RuleEngine:
+    """The engine loaded from the rule tables, or the default rules before load()."""
+    return _engine or DEFAULT_ENGINE
+
+
+def load(db) -> RuleEngine:
+    """Compile the rule tables (seeding empty ones with the defaults) and make it current."""
+    global _engine
+    from models import ActivityLevel, CarbRule, RuleCondition
+
+    if not db.query(CarbRule).first():
+        if not db.query(RuleCondition).first():
+            db.add_all(RuleCondition(name=n, input_name=i, operator=o, threshold=t) for n, i, o, t in DEFAULT_CONDITIONS)
+        if not db.query(ActivityLevel).first():
+            db.add_all(ActivityLevel(name=n, min_steps=m) for n, m in DEFAULT_LEVELS)
+        db.add_all(CarbRule(priority=p, conditions=c, activity_level=lv, modifier=m) for p, c, lv, m in DEFAULT_RULES)
+        db.commit()
+        print("🌱 Seeded carb rule tables with the default rules.")
+
+    _engine = RuleEngine(
+        [(c.name, c.input_name, c.operator, c.threshold) for c in db.query(RuleCondition)],
+        [(lv.name, lv.min_steps) for lv in db.query(ActivityLevel)],
+        [(r.priority, r.conditions, r.activity_level, r.modifier) for r in db.query(CarbRule)],
+    )
+    return _engine
+
+
+def _diabetic_column(engine: RuleEngine):
+    """Index of the "diabetic" condition, or None if the rule tables do not define one."""
+    names = engine.condition_names
+    return names.index("diabetic") if "diabetic" in names else None
 
 
 def is_diabetic(glucose_reading: list) -> bool:
-    for result in glucose_reading:
-        if result.get("glucose_value") > 80:
-            return True
-            print("User is diabetic")
-    return False
+    engine = current()
+    column = _diabetic_column(engine)
+    if column is None:
+        return False
+    met = engine.conditions(engine.readings_from_dicts(glucose_reading), 1)
+    return bool(met[0, column])
 
 
 def classify_activity(steps: int) -> str:
-    if steps < 5000:
-        return "low"
-    elif steps < 10000:
-        return "moderate"
-    else:
-        return "high"
+    engine = current()
+    return engine.level_names[int(engine.levels([steps])[0])]
 
 
 def get_carb_modifier(is_diabetic: bool, activity_level: str) -> float:
-    if not is_diabetic:
-        return 1.0
-    return {
-        "low": 0.70,
-        "moderate": 0.80,
-        "high": 0.90
-    }[activity_level]
+    engine = current()
+    met = np.zeros((1, len(engine.condition_names)), dtype=bool)
+    column = _diabetic_column(engine)
+    if column is not None:
+        met[0, column] = is_diabetic
+    return float(engine.choose(met, np.array([engine.level_names.index(activity_level)]))[0])
 
 
 def adjust_meals_for_user(glucose_reading: list, steps: int, meals_json: list) -> list:
-    diabetic = is_diabetic(glucose_reading)
-    activity_level = classify_activity(steps)
-    modifier = get_carb_modifier(diabetic, activity_level)
-
-    adjusted_meals = []
-    for meal in meals_json:
-        original_carbs = meal["carbs"]
-        adjusted_carbs = round(original_carbs * modifier, 1)
-        adjusted_meals.append({
-            "name": meal["name"],
-            "original_carbs": original_carbs,
-            "adjusted_carbs": adjusted_carbs,
-            "portion_size": modifier
-        })
-
-    return adjusted_meals
+    modifier = current().modifier_for(glucose_reading, steps)
+    return MealCatalog(meals_json, version="").adjusted_meals(modifier)
+
+
+def adjust_catalog_for_user(glucose_reading: list, steps: int, catalog, category: str = None) -> list:
+    """adjust_meals_for_user over a preloaded meal_catalog.MealCatalog (same output)."""
+    return catalog.adjusted_meals(current().modifier_for(glucose_reading, steps), category)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -120,3 +120,8 @@ class PaymentSchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BatchRecommendRequest(BaseModel):
+    user_ids: List[int]
+    category: Optional[str] = None
@@ -1,20 +1,34 @@
 from flask import Flask
 from config import Config
-from models import init_db
-from auth import auth_bp
+from models import init_db, close_conn
+from auth import auth_bp, spike
 from dashboard import dashboard_bp
+import metrics
+import profiling
 
 def create_app():
-    app = Flask(__name__)
+    app = Flask(__name__, template_folder="Templates")
     app.config.from_object(Config)
 
     # Initialise DB
     init_db()
+    app.teardown_appcontext(close_conn)
+
+    # Prometheus-style /metrics (no-op unless METRICS_ENABLED)
+    metrics.init_app(app, spike_clients=(spike,))
+    # Signed-header / sampled request profiling (no-op unless configured)
+    profiling.init_app(app)
 
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
 
+    # Pull Spike data in the background instead of inside page handlers;
+    # every process starts a thread, the sync_lease row lets one run cycles
+    if Config.SYNC_ENABLED:
+        from sync_worker import start_background_sync
+        app.sync_worker = start_background_sync()
+
     return app
 
 if __name__ == "__main__":
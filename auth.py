@@ -1,11 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import get_user_by_email, create_user, verify_password
+from models import create_user, authenticate
+from passwords import HashingBusy
 from spike_client import SpikeClient
 from config import Config
 
 auth_bp = Blueprint("auth", __name__)
 
-spike = SpikeClient(Config.SPIKE_APP_ID, Config.SPIKE_HMAC_KEY)
+spike = SpikeClient.from_config(Config)
 
 
 @auth_bp.route("/", methods=["GET", "POST"])
@@ -17,18 +18,19 @@ def login():
         email = (request.form.get("email") or "").strip().lower()
         password = request.form.get("password") or ""
 
-        user = get_user_by_email(email)
         if not email or not password:
             flash("Please enter both email and password.", "error")
-        elif user and verify_password(user["password_hash"], user["salt"], password):
-            session["user_id"] = user["user_id"]
+            return render_template("login.html")
 
-            try:
-                token = spike.get_access_token(str(user["user_id"]))
-                session["spike_token"] = token
-            except Exception as e:
-                flash(f"Spike token error: {e}", "error")
+        try:
+            user = authenticate(email, password)
+        except HashingBusy:
+            flash("We're handling a lot of sign-ins right now. Please try again in a moment.", "error")
+            return render_template("login.html"), 503
 
+        if user:
+            # Spike tokens are fetched lazily via spike_tokens.get_token, not at sign-in
+            session["user_id"] = user["user_id"]
             flash(f"Welcome, {user['name']}!", "success")
             return redirect(url_for("dashboard.dashboard"))
         else:
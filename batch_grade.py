@@ -0,0 +1,158 @@
+"""
+Cohort-wide sugar grading.
+
+The distinct user_ids of libre_glucose are cut into ranges holding
+chunk-size users each, so sparse or clustered ids still give tasks of
+equal size. Each ProcessPoolExecutor worker opens its own sqlite connection, reads its
+range's windows through the (user_id, ts) index, grades them with
+sugar_score.score_glucose and bulk-writes its rows to sugar_grades, so the
+parent only hands out (first_id, last_id) pairs and adds up counts.
+
+    python batch_grade.py --hours 48 --workers 8 --chunk-size 500
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import scoring_config
+from config import Config
+from sugar_score import score_glucose
+
+RESULT_COLUMNS = (
+    "tir_percent", "tir_score", "variability", "variability_score",
+    "avg_glucose", "avg_score", "spike_count", "spike_score",
+    "final_score", "grade", "interpretation", "suggested_actions",
+)
+
+
+_worker = {}     # per worker process: its own connection and the scoring config
+
+
+def _init_worker(config):
+    from models import _open_conn
+    _worker["conn"] = _open_conn()
+    _worker["config"] = config
+
+
+def _grade_chunk(chunk, config):
+    """Grade a list of (user_id, values) groups."""
+    return [(user_id, score_glucose(values, config=config)) for user_id, values in chunk]
+
+
+def grade_range(conn, config, first_id: int, last_id: int, from_ts: int, to_ts: int,
+                window_hours: int, graded_at: str) -> int:
+    """Read, grade and store the users with first_id <= user_id <= last_id. Returns rows saved."""
+    groups = load_windows(conn, from_ts, to_ts, first_id, last_id)
+    return save_grades(conn, _grade_chunk(groups, config), window_hours, graded_at)
+
+
+def _grade_range_task(args) -> int:
+    """Worker: grade_range on the worker's own connection."""
+    return grade_range(_worker["conn"], _worker["config"], *args)
+
+
+def user_ranges(conn, chunk_size: int):
+    """
+    (first_id, last_id) ranges covering every user_id in libre_glucose,
+    each holding chunk_size distinct users (the last one may hold fewer).
+    """
+    # Skip scan: one index probe per distinct user instead of reading every row
+    user_ids = [r[0] for r in conn.execute("""
+        WITH RECURSIVE ids(user_id) AS (
+            SELECT MIN(user_id) FROM libre_glucose
+            UNION ALL
+            SELECT (SELECT MIN(user_id) FROM libre_glucose WHERE user_id > ids.user_id)
+            FROM ids WHERE ids.user_id IS NOT NULL
+        )
+        SELECT user_id FROM ids WHERE user_id IS NOT NULL
+    """)]
+    return [(chunk[0], chunk[-1])
+            for chunk in (user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size))]
+
+
+def load_windows(conn, from_ts: int, to_ts: int, first_id: int, last_id: int):
+    """
+    libre_glucose for [from_ts, to_ts] and user ids in [first_id, last_id],
+    split into (user_id, values) groups in user_id order.
+    """
+    rows = conn.execute("""
+        SELECT user_id, glucose FROM libre_glucose
+        WHERE user_id BETWEEN ? AND ? AND ts BETWEEN ? AND ?
+        ORDER BY user_id, ts
+    """, (first_id, last_id, from_ts, to_ts)).fetchall()
+    if not rows:
+        return []
+    user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    values = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    bounds = np.flatnonzero(np.diff(user_ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    return [(int(user_ids[s]), part) for s, part in zip(starts, np.split(values, bounds))]
+
+
+def save_grades(conn, graded, window_hours: int, graded_at: str):
+    rows = [
+        (user_id, window_hours, graded_at, *(result[k] for k in RESULT_COLUMNS))
+        for user_id, result in graded if result
+    ]
+    with conn:
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO sugar_grades (user_id, window_hours, graded_at, {", ".join(RESULT_COLUMNS)})
+            VALUES (?, ?, ?, {", ".join("?" for _ in RESULT_COLUMNS)})
+        """, rows)
+    return len(rows)
+
+
+def grade_all(conn=None, hours: int = 48, workers: int = None, chunk_size: int = None, now: datetime = None):
+    """
+    Grade every user with readings in the last `hours` and store the results.
+    Returns a summary dict with users graded, elapsed seconds and users/sec.
+    """
+    from models import get_conn, to_ts, MAX_TS
+
+    if conn is None:
+        conn = get_conn()
+    workers = workers or Config.BATCH_GRADE_WORKERS or os.cpu_count() or 1
+    chunk_size = chunk_size or Config.BATCH_GRADE_CHUNK_SIZE
+
+    started = time.perf_counter()
+    now = now or datetime.now()
+    from_ts = to_ts((now - timedelta(hours=hours)).replace(second=0, microsecond=0))
+
+    config = scoring_config.load(conn)
+    graded_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    tasks = [(first, last, from_ts, MAX_TS, hours, graded_at) for first, last in user_ranges(conn, chunk_size)]
+
+    if workers == 1 or len(tasks) <= 1:
+        saved = sum(grade_range(conn, config, *task) for task in tasks)
+    else:
+        conn.commit()   # workers read through their own connections
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            saved = sum(pool.map(_grade_range_task, tasks))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "users": saved,
+        "workers": workers,
+        "chunks": len(tasks),
+        "seconds": round(elapsed, 3),
+        "users_per_sec": round(saved / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from models import init_db
+
+    parser = argparse.ArgumentParser(description="Grade every user and store results in sugar_grades.")
+    parser.add_argument("--hours", type=int, default=Config.GRADE_WINDOW_HOURS)
+    parser.add_argument("--workers", type=int, default=None, help="process count (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="users per task")
+    args = parser.parse_args()
+
+    init_db()
+    summary = grade_all(hours=args.hours, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"✅ Graded {summary['users']} users in {summary['seconds']}s "
+          f"({summary['users_per_sec']} users/sec, workers={summary['workers']}, chunks={summary['chunks']}).")
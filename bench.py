@@ -0,0 +1,198 @@
+"""
+Micro-benchmarks for the hot paths.
+
+Each scale builds a fresh sqlite database of roughly that many
+libre_glucose rows (plus as many fitbit_steps rows) with synthetic_data,
+then times grading, ingestion, range queries, backfill and the POC rule
+engine. Results go to a JSON file; with --baseline, medians are compared
+against a stored run and any benchmark slower than --threshold times its
+baseline is reported as a regression (exit code 1).
+
+    python bench.py --scales 1k,100k --out bench_results.json
+    python bench.py --scales 1k,100k --save-baseline      # record bench_baseline.json
+    python bench.py --scales 1k,100k --baseline bench_baseline.json
+    python bench.py --scales 10m --repeat 3               # slow: ~1 min to build the data
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from config import Config
+
+# rule_engine lives in the FastAPI POC; append so the root models.py still wins
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "NutritionApp_POC"))
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+MAX_DAYS = 30                 # per-user history; more rows means more users
+BENCH_USER = 1                # user with data that every read benchmark targets
+
+
+def timed(fn, repeat: int, setup=None):
+    """Run fn `repeat` times (setup before each, untimed) and return timing stats in ms."""
+    samples = []
+    for i in range(repeat):
+        arg = setup(i) if setup else None
+        started = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def build_db(path: str, rows: int):
+    """Fresh database at `path` with ~rows glucose readings spread over whole users."""
+    import models
+    import synthetic_data
+
+    models.close_conn()
+    Config.DB_PATH = path
+    models.init_db()
+
+    days = min(MAX_DAYS, max(1, math.ceil(rows / 96)))
+    users = max(1, math.ceil(rows / (days * 96 + 1)))
+    return synthetic_data.populate(users=users, days=days, interval=15, seed=0, chunk_users=100)
+
+
+def run_scale(name: str, rows: int, repeat: int, max_catalog: int):
+    import models
+    import grade_cache
+    import rule_engine
+    import sync_worker
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = build_db(os.path.join(tmp, "bench.db"), rows)
+        users = summary["users"]
+        new_user = iter(range(users + 1, users + 1_000_000))
+
+        # Discard the printed grade report, keep stdout for our own output
+        with contextlib.redirect_stdout(io.StringIO()):
+            models.calculate_sugar_grade(BENCH_USER, 48)      # builds the rolling state once
+
+            def grade_uncached(hours):
+                grade_cache.clear()
+                models.calculate_sugar_grade(BENCH_USER, hours)
+
+            results["calculate_sugar_grade"] = timed(lambda: grade_uncached(Config.GRADE_WINDOW_HOURS), repeat)
+            results["calculate_sugar_grade_raw_72h"] = timed(lambda: grade_uncached(72), repeat)
+            results["calculate_sugar_grade_cached"] = timed(
+                lambda: models.calculate_sugar_grade(BENCH_USER, Config.GRADE_WINDOW_HOURS), repeat)
+
+            results["get_libre_glucose_48h"] = timed(lambda: models.get_libre_glucose(BENCH_USER, 48), repeat)
+            results["get_fitbit_steps_7d"] = timed(lambda: models.get_fitbit_steps(BENCH_USER, since_days=7), repeat)
+
+            # Ingestion: 96 single inserts vs one bulk call of 288 readings, each into a fresh user
+            day = [("2030-01-01", f"{m // 60:02d}:{m % 60:02d}", 100 + m % 40) for m in range(0, 1440, 5)]
+
+            def single_inserts(uid):
+                for d, t, v in day[::3]:
+                    models.add_libre_glucose(uid, d, t, v)
+
+            results["add_libre_glucose_x96"] = timed(single_inserts, repeat, setup=lambda i: next(new_user))
+            results["add_libre_glucose_bulk_288"] = timed(
+                lambda uid: models.add_libre_glucose_bulk(uid, day), repeat, setup=lambda i: next(new_user))
+            results["add_fitbit_steps_bulk_288"] = timed(
+                lambda uid: models.add_fitbit_steps_bulk(uid, day), repeat, setup=lambda i: next(new_user))
+
+            # backfill only fills slots older than the Libre sync cursor
+            def synced_user(i=None, uid=None):
+                uid = uid or next(new_user)
+                with models.get_conn() as conn:
+                    sync_worker.save_cursor(conn, uid, "libre", "glucose", models.to_ts(datetime.now()))
+                return uid
+
+            results["backfill_libre_glucose_empty"] = timed(
+                lambda uid: models.backfill_libre_glucose(uid, 48), repeat, setup=synced_user)
+            synced_user(uid=BENCH_USER)
+            models.backfill_libre_glucose(BENCH_USER, 48)
+            results["backfill_libre_glucose_full"] = timed(lambda: models.backfill_libre_glucose(BENCH_USER, 48), repeat)
+
+        # Rule engine over a catalog as large as the scale (capped to keep memory sane)
+        catalog_size = min(rows, max_catalog)
+        catalog = [{"name": f"meal {i}", "carbs": float(i % 90 + 5)} for i in range(catalog_size)]
+        readings = [{"glucose_value": 95}] * 96
+        results[f"adjust_meals_for_user_{catalog_size}"] = timed(
+            lambda: rule_engine.adjust_meals_for_user(readings, 7000, catalog), repeat)
+
+        models.close_conn()
+
+    return summary, results
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Return [(key, baseline_ms, now_ms, ratio)] for benchmarks slower than threshold x baseline."""
+    regressions = []
+    for key, now in results.items():
+        base = baseline.get(key)
+        if not base or not base["median_ms"]:
+            continue
+        ratio = now["median_ms"] / base["median_ms"]
+        if ratio > threshold:
+            regressions.append((key, base["median_ms"], now["median_ms"], round(ratio, 2)))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark grading, ingestion, queries, backfill and the rule engine.")
+    parser.add_argument("--scales", default="1k,100k", help=f"comma list of {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per benchmark")
+    parser.add_argument("--max-catalog", type=int, default=1_000_000, help="cap on rule engine catalog size")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help="also write results to bench_baseline.json")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    db_path = Config.DB_PATH
+    report = {
+        "meta": {
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "scales": {},
+        "results": {},
+    }
+    for name in args.scales.split(","):
+        name = name.strip().lower()
+        summary, results = run_scale(name, SCALES[name], args.repeat, args.max_catalog)
+        report["scales"][name] = summary
+        print(f"\n=== {name}: {summary['rows']} glucose + steps rows, {summary['users']} users (built in {summary['seconds']}s) ===")
+        for bench, r in results.items():
+            report["results"][f"{name}/{bench}"] = r
+            print(f"  {bench:<36} median {r['median_ms']:>10.3f} ms   min {r['min_ms']:>10.3f} ms")
+    Config.DB_PATH = db_path
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.out}")
+    if args.save_baseline:
+        with open("bench_baseline.json", "w") as f:
+            json.dump(report, f, indent=2)
+        print("✅ Baseline written to bench_baseline.json")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold}x baseline:")
+            for key, base_ms, now_ms, ratio in regressions:
+                print(f"  {key:<44} {base_ms:.3f} ms -> {now_ms:.3f} ms ({ratio}x)")
+            sys.exit(1)
+        print(f"\n✅ No regressions over {args.threshold}x baseline.")
@@ -1,6 +1,9 @@
 import sqlite3
 from datetime import datetime, timedelta
-import random
+import numpy as np
+from synthetic_data import SlotGrid, glucose_values
+
+SEED = 42
 
 # Connect to SQLite DB file (or create it)
 conn = sqlite3.connect("diabetes_data.db")
@@ -16,14 +19,14 @@ CREATE TABLE IF NOT EXISTS diabetic_measurements (
 """)
 
 # Populate table with sample 24-hour data (every 15 mins = 96 readings)
+# Seeded meal-spike data from synthetic_data, so every build is identical
 start_time = datetime.strptime("2025-07-20 00:00", "%Y-%m-%d %H:%M")
-for i in range(96):
-    timestamp = start_time + timedelta(minutes=15 * i)
-    glucose_value = random.randint(60, 200)  # Simulated data
-    cursor.execute("""
-        INSERT INTO diabetic_measurements (timestamp, glucose_value)
-        VALUES (?, ?)
-    """, (timestamp.isoformat(), glucose_value))
+grid = SlotGrid(start_time, start_time + timedelta(minutes=15 * 95), 15)
+values = glucose_values(np.random.default_rng(SEED), 1, grid)[0]
+cursor.executemany("""
+    INSERT INTO diabetic_measurements (timestamp, glucose_value)
+    VALUES (?, ?)
+""", [(f"{d}T{t}:00", float(v)) for d, t, v in zip(grid.dates, grid.times, values)])
 
 # Create table for Sugar Control Grading Matrix
 cursor.execute("""
@@ -9,6 +9,71 @@ class Config:
     DB_PATH = os.getenv("DB_PATH", "users_web.db")
     SPIKE_APP_ID = os.getenv("SPIKE_APP_ID")
     SPIKE_HMAC_KEY = os.getenv("SPIKE_HMAC_KEY")
+    SPIKE_BASE_URL = os.getenv("SPIKE_BASE_URL", "https://app-api.spikeapi.com/v3")   # point at fake_spike.py for load tests
+    SPIKE_POOL_SIZE = int(os.getenv("SPIKE_POOL_SIZE", "10"))
+    SPIKE_CONNECT_TIMEOUT = float(os.getenv("SPIKE_CONNECT_TIMEOUT", "3.05"))   # seconds
+    SPIKE_READ_TIMEOUT = float(os.getenv("SPIKE_READ_TIMEOUT", "10"))          # seconds
+    SPIKE_MAX_RETRIES = int(os.getenv("SPIKE_MAX_RETRIES", "3"))               # on 429/5xx/connection errors
+    SPIKE_BACKOFF = float(os.getenv("SPIKE_BACKOFF", "0.5"))                   # base delay, doubled per retry
+    SPIKE_MAX_RETRY_DELAY = float(os.getenv("SPIKE_MAX_RETRY_DELAY", "10"))    # longest sleep between attempts
+    SPIKE_MAX_IN_FLIGHT = int(os.getenv("SPIKE_MAX_IN_FLIGHT", "20"))          # AsyncSpikeClient concurrency cap
+
+    # Shared Spike token cache (spike_tokens.py)
+    SPIKE_TOKEN_TTL = int(os.getenv("SPIKE_TOKEN_TTL", "3600"))                # when Spike sends no expires_in
+    SPIKE_TOKEN_REFRESH_MARGIN = int(os.getenv("SPIKE_TOKEN_REFRESH_MARGIN", "60"))  # refresh this early
+    SPIKE_TOKEN_LEASE = int(os.getenv("SPIKE_TOKEN_LEASE", "10"))              # max seconds one refresh may hold others
+    SPIKE_TOKEN_WAIT = float(os.getenv("SPIKE_TOKEN_WAIT", "5"))               # give up waiting on another refresh after this
+
+    # sqlite connection tuning (applied to every pooled connection)
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))        # negative = KiB
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    # Sugar grading window kept incrementally in grade_state
+    GRADE_WINDOW_HOURS = int(os.getenv("GRADE_WINDOW_HOURS", "48"))
+
+    # Grade result cache: in-process LRU, optionally shared via sqlite
+    GRADE_CACHE_SIZE = int(os.getenv("GRADE_CACHE_SIZE", "1024"))
+    GRADE_CACHE_TTL = int(os.getenv("GRADE_CACHE_TTL", "300"))          # seconds
+    GRADE_CACHE_SHARED = os.getenv("GRADE_CACHE_SHARED", "0") == "1"
+
+    # User profile cache (user_cache.py)
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "600"))            # seconds
+
+    # batch_grade.py defaults (0 workers = one per CPU)
+    BATCH_GRADE_WORKERS = int(os.getenv("BATCH_GRADE_WORKERS", "0"))
+    BATCH_GRADE_CHUNK_SIZE = int(os.getenv("BATCH_GRADE_CHUNK_SIZE", "500"))
+
+    # Background Spike sync (sync_worker.py); SYNC_ENABLED runs it as a thread in the web app.
+    # Pages never call Spike, so production must either set SYNC_ENABLED=1 or run
+    # `python sync_worker.py --once` from cron; otherwise no Spike data arrives.
+    SYNC_ENABLED = os.getenv("SYNC_ENABLED", "0") == "1"
+    SYNC_INTERVAL_SECONDS = int(os.getenv("SYNC_INTERVAL_SECONDS", "300"))     # per-user resync interval
+    SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "100"))                 # users fetched together
+    SYNC_MAX_USERS_PER_CYCLE = int(os.getenv("SYNC_MAX_USERS_PER_CYCLE", "1000"))
+    SYNC_LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", "300"))           # one process runs a cycle at a time
+
+    # Password hashing pool (passwords.py); 0 workers = hash inline
+    PASSWORD_ITERATIONS = int(os.getenv("PASSWORD_ITERATIONS", "100000"))      # PBKDF2-SHA256; old hashes upgrade on login
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))   # more are shed with a 503
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))     # seconds
+
+    # Request/sqlite/Spike/cache metrics on GET /metrics (metrics.py)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+    # On-demand profiling and slow-query log (profiling.py)
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SECRET = os.getenv("PROFILE_SECRET")                               # enables signed X-Profile headers
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))         # fraction of requests profiled
+    PROFILE_SAMPLE_MODE = os.getenv("PROFILE_SAMPLE_MODE", "cprofile")         # cprofile | tracemalloc
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))                     # 0 = slow-query log off
+
+    # Dev mode: seed synthetic Libre readings and backfill gaps when /libre-data is opened
+    DEV_SEED_FAKE_DATA = os.getenv("DEV_SEED_FAKE_DATA", "0") == "1"
 
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Lax"
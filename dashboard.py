@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, redirect, request, url_for, session, flash
 from models import get_user_by_id, seed_fake_libre
-import requests
-from datetime import datetime, timedelta, timezone
+from auth import spike
+from config import Config
+import spike_tokens
 from collections import defaultdict
 from models import get_conn
 from models import calculate_sugar_grade
@@ -22,26 +23,29 @@ def dashboard():
         flash("Session expired. Please sign in again.", "error")
         return redirect(url_for("auth.login"))
 
-    has_fitbit = bool(session.get("spike_token"))
+    # Connected once Spike issues this user a token; issued lazily and cached in spike_tokens
+    try:
+        spike_tokens.get_token(spike, uid)
+        has_fitbit = True
+    except Exception as e:
+        print("Spike token error:", e)
+        has_fitbit = False
     return render_template("dashboard.html", user=user, has_fitbit=has_fitbit)
 
 
 @dashboard_bp.route("/connect/fitbit")
 def connect_fitbit():
-    token = session.get("spike_token")
-    if not token:
-        flash("No Spike token, please log in again.", "error")
+    uid = session.get("user_id")
+    if not uid:
         return redirect(url_for("auth.login"))
 
-    resp = requests.get(
-        "https://app-api.spikeapi.com/v3/providers/fitbit/integration/init_url",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-
-    if resp.ok:
-        redirect_url = resp.json().get("path")
+    try:
+        token = spike_tokens.get_token(spike, uid)
+        redirect_url = spike.get_init_url("fitbit", token).get("path")
         return redirect(redirect_url or url_for("dashboard.dashboard"))
-    else:
+    except RuntimeError as e:
+        print("Fitbit connect error:", e)
+        spike_tokens.invalidate(get_conn(), uid)
         flash("Failed to start Fitbit connection", "error")
         return redirect(url_for("dashboard.dashboard"))
 
@@ -52,43 +56,7 @@ def fitbit_data():
     if not uid:
         return redirect(url_for("auth.login"))
 
-    token = session.get("spike_token")
-    if not token:
-        flash("No Spike token, please log in again.", "error")
-        return redirect(url_for("auth.login"))
-
-    try:
-        url = "https://app-api.spikeapi.com/v3/queries/timeseries"
-        headers = {"Authorization": f"Bearer {token}"}
-
-        end = datetime.now(timezone.utc)
-        start = end - timedelta(days=7)
-
-        params = {
-            "metric": "steps",
-            "from_timestamp": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "to_timestamp": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "interval": "5minute"
-        }
-
-        resp = requests.get(url, headers=headers, params=params)
-        if resp.ok:
-            data = resp.json()
-            if isinstance(data, dict) and "values" in data:
-                from models import add_fitbit_step, get_fitbit_steps
-                base = datetime.fromisoformat(data["from_timestamp"].replace("Z", "+00:00"))
-                for offset, value in zip(data["offsets"], data["values"]):
-                    ts = base + timedelta(milliseconds=offset)
-                    add_fitbit_step(
-                        uid,
-                        ts.strftime("%Y-%m-%d"),
-                        ts.strftime("%H:%M"),
-                        int(value)
-                    )
-    except Exception as e:
-        print("Fitbit fetch error:", e)
-
-    # Always query from DB, never display from memory
+    # Spike data is pulled in by sync_worker.py; pages only read from the DB
     from models import get_fitbit_steps
     fitbit_data_db = get_fitbit_steps(uid, since_days=7)
 
@@ -96,17 +64,16 @@ def fitbit_data():
 
 @dashboard_bp.route("/connect/libre")
 def connect_libre():
-    token = session.get("spike_token")
-    if not token:
+    uid = session.get("user_id")
+    if not uid:
         return redirect(url_for("auth.login"))
 
-    resp = requests.get(
-        "https://app-api.spikeapi.com/v3/providers/freestyle_libre/integration/init_url",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    if resp.ok:
-        return redirect(resp.json().get("path"))
-    else:
+    try:
+        token = spike_tokens.get_token(spike, uid)
+        return redirect(spike.get_init_url("freestyle_libre", token).get("path"))
+    except RuntimeError as e:
+        print("Libre connect error:", e)
+        spike_tokens.invalidate(get_conn(), uid)
         return "Libre connection failed", 400
 
 
@@ -116,47 +83,14 @@ def libre_data():
     if not uid:
         return redirect(url_for("auth.login"))
 
-    token = session.get("spike_token")
-    if not token:
-        return redirect(url_for("auth.login"))
-
-    try:
-        url = "https://app-api.spikeapi.com/v3/queries/timeseries"
-        headers = {"Authorization": f"Bearer {token}"}
-        end = datetime.now(timezone.utc)
-        start = end - timedelta(days=1)
-
-        params = {
-            "provider_slug": "libre",
-            "metric": "glucose",
-            "from_timestamp": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "to_timestamp": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "interval": "5minute"
-        }
-
-        resp = requests.get(url, headers=headers, params=params)
-        if resp.ok:
-            data = resp.json()
-            if isinstance(data, dict) and "values" in data:
-                from models import add_libre_glucose
-                base = datetime.fromisoformat(data["from_timestamp"].replace("Z", "+00:00"))
-                for offset, value in zip(data["offsets"], data["values"]):
-                    ts = base + timedelta(milliseconds=offset)
-                    add_libre_glucose(
-                        uid,
-                        ts.strftime("%Y-%m-%d"),
-                        ts.strftime("%H:%M"),
-                        float(value)
-                    )
-    except Exception as e:
-        print("Libre fetch error:", e)
-
+    # Spike data is pulled in by sync_worker.py; pages only read from the DB
     from models import get_libre_glucose
-        # ✨ Run the fake seeder here for this user
-    seed_fake_libre(user_id=uid, days=1)
+    # ✨ Fake seeder and gap backfill (random values) for local development only
+    if Config.DEV_SEED_FAKE_DATA:
+        seed_fake_libre(user_id=uid, days=1)
+        backfill_libre_glucose(uid, hours=48)
 
     # Then query DB for refreshed data
-    backfill_libre_glucose(uid, hours=48)
     libre_data_db = get_libre_glucose(uid, hours=48)
 
     return render_template("libre.html", grouped=group_by_day(libre_data_db))
@@ -0,0 +1,181 @@
+"""
+Local stand-in for the Spike API, for load tests and offline development.
+
+Implements POST /auth/hmac, GET /userinfo, GET /queries/timeseries and
+GET /providers/<slug>/integration/init_url with the response shapes
+spike_client expects. Every response can be delayed (--latency-ms,
+--jitter-ms), timeseries payloads can be capped or padded to a fixed
+number of points (--points), and a fraction of requests can fail with 503
+(--error-rate) to exercise the client retries.
+
+    python fake_spike.py --port 8081 --latency-ms 80 --jitter-ms 40
+    SPIKE_BASE_URL=http://127.0.0.1:8081/v3 python app.py
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+INTERVAL_SECONDS = {"1minute": 60, "5minute": 300, "15minute": 900, "hour": 3600, "day": 86400}
+
+
+class FakeSpikeSettings:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, points: int = 0,
+                 error_rate: float = 0.0, token_ttl: int = 3600, hmac_key: str = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.points = points              # 0 = one point per interval in the requested window
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.hmac_key = hmac_key          # verify signatures when set
+
+
+def _parse_ts(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def timeseries_payload(metric: str, start: datetime, end: datetime, interval: str, points: int = 0):
+    """Spike-shaped timeseries: offsets in ms from from_timestamp plus one value per offset."""
+    step = INTERVAL_SECONDS.get(interval, 300)
+    count = max(0, int((end - start).total_seconds() // step) + 1)
+    if points:
+        count = points
+    if metric == "glucose":
+        values = [random.randint(70, 180) for _ in range(count)]
+    else:
+        values = [random.randint(0, 800) for _ in range(count)]
+    return {
+        "metric": metric,
+        "interval": interval,
+        "from_timestamp": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "to_timestamp": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "offsets": [i * step * 1000 for i in range(count)],
+        "values": values,
+    }
+
+
+class FakeSpikeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"      # keep-alive, like the real API
+    settings = FakeSpikeSettings()
+    tokens = {}                        # access_token -> application_user_id
+    tokens_lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        head = (
+            f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n"
+        ).encode()
+        # Headers and body in one write: separate small writes trip delayed ACKs
+        self.wfile.write(head + data)
+
+    def _delay_or_fail(self) -> bool:
+        s = self.settings
+        if s.latency_ms or s.jitter_ms:
+            time.sleep(max(0.0, s.latency_ms + random.uniform(-s.jitter_ms, s.jitter_ms)) / 1000)
+        if s.error_rate and random.random() < s.error_rate:
+            self._send(503, {"error": "fake outage"})
+            return True
+        return False
+
+    def _user_for_token(self):
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:] if auth.startswith("Bearer ") else None
+        with self.tokens_lock:
+            return self.tokens.get(token)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self._delay_or_fail():
+            return
+        if urlparse(self.path).path.rstrip("/").endswith("/auth/hmac"):
+            try:
+                data = json.loads(body or b"{}")
+                user_id = str(data["application_user_id"])
+            except (ValueError, KeyError):
+                return self._send(400, {"error": "application_user_id required"})
+            key = self.settings.hmac_key
+            if key:
+                expected = hmac.new(key.encode(), user_id.encode(), hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, str(data.get("signature", ""))):
+                    return self._send(401, {"error": "bad signature"})
+            token = secrets.token_hex(16)
+            with self.tokens_lock:
+                self.tokens[token] = user_id
+            return self._send(200, {"access_token": token, "expires_in": self.settings.token_ttl})
+        self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        user_id = self._user_for_token()
+        if user_id is None:
+            return self._send(401, {"error": "invalid or missing token"})
+
+        if path.endswith("/userinfo"):
+            return self._send(200, {"application_user_id": user_id,
+                                    "providers": ["fitbit", "freestyle_libre"]})
+
+        if path.endswith("/queries/timeseries"):
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            end = _parse_ts(q["to_timestamp"]) if "to_timestamp" in q else datetime.now(timezone.utc)
+            start = _parse_ts(q["from_timestamp"]) if "from_timestamp" in q else end - timedelta(days=1)
+            return self._send(200, timeseries_payload(q.get("metric", "steps"), start, end,
+                                                      q.get("interval", "5minute"), self.settings.points))
+
+        if path.endswith("/integration/init_url"):
+            slug = path.split("/")[-3]
+            host = self.headers.get("Host", "127.0.0.1")
+            return self._send(200, {"path": f"http://{host}/fake-connect/{slug}?user={user_id}"})
+
+        self._send(404, {"error": "not found"})
+
+
+class FakeSpikeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(host: str = "127.0.0.1", port: int = 8081, settings: FakeSpikeSettings = None, background: bool = False):
+    """Start the stand-in. With background=True it runs in a daemon thread and the server is returned."""
+    if settings is not None:
+        FakeSpikeHandler.settings = settings
+    server = FakeSpikeServer((host, port), FakeSpikeHandler)
+    if background:
+        threading.Thread(target=server.serve_forever, name="fake-spike", daemon=True).start()
+        return server
+    print(f"✅ Fake Spike API on http://{host}:{server.server_address[1]}/v3")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Spike API stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="+/- random spread on the latency")
+    parser.add_argument("--points", type=int, default=0, help="fixed timeseries length (0 = follow the window)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--token-ttl", type=int, default=3600, help="expires_in for issued tokens")
+    parser.add_argument("--hmac-key", default=None, help="verify request signatures with this key")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, FakeSpikeSettings(args.latency_ms, args.jitter_ms, args.points,
+                                                  args.error_rate, args.token_ttl, args.hmac_key))
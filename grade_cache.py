@@ -0,0 +1,102 @@
+"""
+Sugar grade result cache.
+
+Entries are keyed by (user_id, window_hours) and tagged with the user's
+glucose version from grade_versions, which every libre_glucose write path
+bumps via bump_version(). An entry is served only while its version is
+current and its TTL has not run out (readings also age out of the window).
+
+Tier 1 is a bounded in-process LRU. With Config.GRADE_CACHE_SHARED set,
+results are also kept in the grade_cache table so every gunicorn worker
+shares them.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # (user_id, window_hours) -> (version, expires_at, result)
+_stats = {"hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def current_version(conn, user_id: int) -> int:
+    row = conn.execute("SELECT version FROM grade_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_version(conn, user_id: int):
+    """Mark a user's cached grades stale. Runs in the caller's write transaction."""
+    conn.execute("""
+        INSERT INTO grade_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+    """, (user_id,))
+    with _lock:
+        for key in [k for k in _entries if k[0] == user_id]:
+            del _entries[key]
+
+
+def get(conn, user_id: int, window_hours: int, version: int):
+    """Return a cached result dict for this version, or None on a miss."""
+    key = (user_id, window_hours)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] == version and entry[1] > now:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return dict(entry[2])
+
+    if Config.GRADE_CACHE_SHARED:
+        row = conn.execute("""
+            SELECT expires_at, result FROM grade_cache
+            WHERE user_id = ? AND window_hours = ? AND version = ? AND expires_at > ?
+        """, (user_id, window_hours, version, now)).fetchone()
+        if row:
+            result = json.loads(row[1])
+            _store(key, version, row[0], result)
+            with _lock:
+                _stats["shared_hits"] += 1
+            return dict(result)
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def put(conn, user_id: int, window_hours: int, version: int, result: dict):
+    expires_at = time.time() + Config.GRADE_CACHE_TTL
+    _store((user_id, window_hours), version, expires_at, dict(result))
+    if Config.GRADE_CACHE_SHARED:
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO grade_cache (user_id, window_hours, version, expires_at, result)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user_id, window_hours, version, expires_at, json.dumps(result)))
+
+
+def _store(key, version: int, expires_at: float, result: dict):
+    with _lock:
+        _entries[key] = (version, expires_at, result)
+        _entries.move_to_end(key)
+        while len(_entries) > Config.GRADE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def stats() -> dict:
+    """Hit/miss counters plus the hit rate, e.g. for logging or a metrics endpoint."""
+    with _lock:
+        s = dict(_stats, size=len(_entries))
+    lookups = s["hits"] + s["shared_hits"] + s["misses"]
+    s["hit_rate"] = round((s["hits"] + s["shared_hits"]) / lookups, 4) if lookups else 0.0
+    return s
+
+
+def clear():
+    """Drop every in-process entry and reset the counters."""
+    with _lock:
+        _entries.clear()
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,173 @@
+"""
+End-to-end load driver for the Flask app.
+
+Registers and logs in --users accounts, then has --concurrency threads hit
+the data routes as those users for --duration seconds and reports
+throughput and p50/p95/p99 latency per route.
+
+By default it starts everything itself: fake_spike.py in a thread (with
+--spike-latency-ms etc.) and the app on a threaded werkzeug server pointed
+at it via SPIKE_BASE_URL. That local stack uses a fresh temporary sqlite
+file (or --db-path) and dummy SPIKE_APP_ID/SPIKE_HMAC_KEY values, so it
+needs no .env and never writes load-test users into users_web.db. Pass
+--app-url to drive an app that is already running instead; it keeps its
+own DB and credentials. Set SYNC_ENABLED=1 to include background sync
+traffic.
+
+    python load_test.py --users 50 --concurrency 16 --duration 30 --spike-latency-ms 80
+    python load_test.py --app-url http://127.0.0.1:5000 --routes /dashboard,/sugar-grading
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+DEFAULT_ROUTES = "/dashboard,/fitbit-data,/libre-data,/sugar-grading"
+PASSWORD = "loadtest-pass-1"
+
+
+def start_local_stack(spike_settings, db_path: str):
+    """Fake Spike + the app on ephemeral ports, in daemon threads. Returns the app URL."""
+    # Set before config.py is imported (load_dotenv does not override them):
+    # fake_spike accepts any signature, and auth.py needs credentials at import
+    os.environ["DB_PATH"] = db_path
+    os.environ["SPIKE_APP_ID"] = "loadtest"
+    os.environ["SPIKE_HMAC_KEY"] = "loadtest-key"
+
+    import fake_spike
+    from config import Config
+
+    spike = fake_spike.serve("127.0.0.1", 0, spike_settings, background=True)
+    Config.SPIKE_BASE_URL = f"http://127.0.0.1:{spike.server_address[1]}/v3"
+
+    # Import after SPIKE_BASE_URL is set: auth.py builds its client at import time
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def login_users(app_url: str, count: int):
+    """Register (if needed) and sign in `count` users. Returns one logged-in Session per user."""
+    sessions = []
+    for i in range(count):
+        s = requests.Session()
+        email = f"loadtest+{i}@example.com"
+        s.post(f"{app_url}/register", data={
+            "name": f"Load Test {i}", "email": email, "dob": "1990-01-01",
+            "gender": "Other", "password": PASSWORD, "confirm": PASSWORD,
+        }, allow_redirects=False)
+        resp = s.post(f"{app_url}/", data={"email": email, "password": PASSWORD}, allow_redirects=False)
+        if resp.status_code != 302:
+            raise RuntimeError(f"login failed for {email}: HTTP {resp.status_code}")
+        sessions.append(s)
+    return sessions
+
+
+def percentile_summary(samples, elapsed: float):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+def run(app_url: str, sessions, routes, concurrency: int, duration: float):
+    """Drive the routes until `duration` runs out. Returns {route: summary} plus an "ALL" row."""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(mine):
+        local, local_errors = defaultdict(list), defaultdict(int)
+        i = 0
+        while mine and time.perf_counter() < deadline:
+            s = mine[i % len(mine)]
+            for route in routes:
+                started = time.perf_counter()
+                try:
+                    status = s.get(f"{app_url}{route}", allow_redirects=False, timeout=30).status_code
+                except requests.RequestException:
+                    status = None
+                local[route].append((time.perf_counter() - started) * 1000)
+                if status is None or status >= 400:
+                    local_errors[route] += 1
+            i += 1
+        with lock:
+            for route, samples in local.items():
+                latencies[route].extend(samples)
+            for route, n in local_errors.items():
+                errors[route] += n
+
+    # Sessions are not thread-safe, so each thread owns a slice of the users
+    threads = [threading.Thread(target=worker, args=(sessions[t::concurrency],)) for t in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for route in routes:
+        if latencies[route]:
+            report[route] = dict(percentile_summary(latencies[route], elapsed), errors=errors[route])
+    every = [ms for samples in latencies.values() for ms in samples]
+    if every:
+        report["ALL"] = dict(percentile_summary(every, elapsed), errors=sum(errors.values()))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the app's data routes.")
+    parser.add_argument("--app-url", default=None, help="drive a running app instead of starting one")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15, help="seconds")
+    parser.add_argument("--routes", default=DEFAULT_ROUTES, help="comma-separated paths")
+    parser.add_argument("--spike-latency-ms", type=float, default=50)
+    parser.add_argument("--spike-jitter-ms", type=float, default=20)
+    parser.add_argument("--spike-points", type=int, default=0)
+    parser.add_argument("--spike-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-path", default=None, help="sqlite file for the local stack (default: a new temp file)")
+    parser.add_argument("--out", default=None, help="also write the report as JSON")
+    args = parser.parse_args()
+
+    app_url = args.app_url
+    if not app_url:
+        from fake_spike import FakeSpikeSettings
+        db_path = args.db_path or os.path.join(tempfile.mkdtemp(prefix="load_test_"), "load_test.db")
+        print(f"Local stack database: {db_path}")
+        app_url = start_local_stack(FakeSpikeSettings(args.spike_latency_ms, args.spike_jitter_ms,
+                                                      args.spike_points, args.spike_error_rate), db_path)
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    concurrency = min(args.concurrency, args.users)
+
+    sessions = login_users(app_url, args.users)
+    print(f"Logged in {len(sessions)} users; {concurrency} threads for {args.duration}s against {app_url}")
+    report = run(app_url, sessions, routes, concurrency, args.duration)
+
+    print(f"\n{'route':<20}{'reqs':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, r in report.items():
+        print(f"{route:<20}{r['requests']:>8}{r['errors']:>8}{r['rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.out}")
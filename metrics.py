@@ -0,0 +1,230 @@
+"""
+Request, sqlite, Spike and cache metrics in Prometheus text format.
+
+init_app() wires everything into the Flask app when Config.METRICS_ENABLED
+is set; otherwise it returns without registering a single hook, and
+models._open_conn keeps plain sqlite3 connections, so the disabled cost is
+one boolean check per connection.
+
+When enabled:
+- every request's duration is observed per endpoint/method/status;
+- connections are InstrumentedConnection, which times each statement
+  (until its first row is ready) and counts statements per request;
+- SpikeClient calls are observed per endpoint through SpikeClient.observers,
+  and the sync worker adds observe_spike_call to each AsyncSpikeClient it builds;
+- grade_cache and user_cache hit/miss counters are read at scrape time.
+
+The same connections feed the slow-query log (profiling.log_slow_query)
+when SLOW_QUERY_MS is set, even with metrics off.
+
+GET /metrics returns everything. Values are per process, so with several
+gunicorn workers each one is scraped (or aggregated) separately.
+"""
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+
+import profiling
+from config import Config
+
+_lock = threading.Lock()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *label_values):
+        with _lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[bisect_left(self.buckets, value)] += 1
+            s[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, s in sorted(series.items()):
+            cumulative = 0
+            for le, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                cumulative += n
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {s[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            values = dict(self._values)
+        for label_values, v in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {v}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Flask request duration.",
+                            ("endpoint", "method", "status"))
+REQUEST_SQL = Histogram("http_request_sqlite_statements", "sqlite statements run per request.",
+                        ("endpoint",), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("http_request_sqlite_seconds", "Time spent in sqlite per request.",
+                                ("endpoint",), SQL_BUCKETS)
+SQL_SECONDS = Histogram("sqlite_statement_duration_seconds", "sqlite statement duration by verb.",
+                        ("verb",), SQL_BUCKETS)
+SPIKE_SECONDS = Histogram("spike_request_duration_seconds", "Spike API call duration, retries included.",
+                          ("endpoint", "outcome"))
+SPIKE_RETRIES = Counter("spike_request_retries_total", "Spike API retries.", ("endpoint",))
+
+REGISTRY = [REQUEST_SECONDS, REQUEST_SQL, REQUEST_SQL_SECONDS, SQL_SECONDS, SPIKE_SECONDS, SPIKE_RETRIES]
+
+
+def record_sql(sql: str, parameters, seconds: float):
+    if Config.SLOW_QUERY_MS and seconds * 1000 >= Config.SLOW_QUERY_MS:
+        profiling.log_slow_query(sql, parameters, seconds)
+    if not Config.METRICS_ENABLED:
+        return
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+    SQL_SECONDS.observe(seconds, verb)
+    if has_request_context():
+        g._sql_count = g.get("_sql_count", 0) + 1
+        g._sql_seconds = g.get("_sql_seconds", 0.0) + seconds
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_sql(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_sql(sql, "<executemany>", time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are timed, counted and slow-logged (see record_sql)."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def observe_spike_call(endpoint: str, elapsed_ms: float, failed: bool, retries: int):
+    """SpikeClient observer: one histogram sample per call, plus its retries."""
+    SPIKE_SECONDS.observe(elapsed_ms / 1000, endpoint, "error" if failed else "ok")
+    if retries:
+        SPIKE_RETRIES.inc(retries, endpoint)
+
+
+def _cache_lines():
+    import grade_cache
+
+    s = grade_cache.stats()
+    return [
+        "# HELP grade_cache_lookups_total Sugar grade cache lookups by result.",
+        "# TYPE grade_cache_lookups_total counter",
+        f'grade_cache_lookups_total{{result="hit"}} {s["hits"]}',
+        f'grade_cache_lookups_total{{result="shared_hit"}} {s["shared_hits"]}',
+        f'grade_cache_lookups_total{{result="miss"}} {s["misses"]}',
+        "# HELP grade_cache_entries Entries in the in-process grade cache.",
+        "# TYPE grade_cache_entries gauge",
+        f"grade_cache_entries {s['size']}",
+    ] + _user_cache_lines()
+
+
+def _user_cache_lines():
+    import user_cache
+
+    s = user_cache.stats()
+    return [
+        "# HELP user_cache_lookups_total User profile cache lookups by result.",
+        "# TYPE user_cache_lookups_total counter",
+        f'user_cache_lookups_total{{result="hit"}} {s["hits"]}',
+        f'user_cache_lookups_total{{result="miss"}} {s["misses"]}',
+        "# HELP user_cache_entries Entries in the in-process user profile cache.",
+        "# TYPE user_cache_entries gauge",
+        f"user_cache_entries {s['size']}",
+    ]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_cache_lines())
+    return "\n".join(lines) + "\n"
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop("_metrics_started", None)
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method, str(response.status_code))
+        REQUEST_SQL.observe(g.get("_sql_count", 0), endpoint)
+        REQUEST_SQL_SECONDS.observe(g.get("_sql_seconds", 0.0), endpoint)
+    return response
+
+
+def metrics_view():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, spike_clients=()):
+    """Register the hooks and GET /metrics, only when Config.METRICS_ENABLED."""
+    if not Config.METRICS_ENABLED:
+        return
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    for client in spike_clients:
+        client.observers.append(observe_spike_call)
@@ -1,23 +1,113 @@
 import sqlite3
+import calendar
+import threading
 import re
-import hashlib
 import secrets
-import hmac
 import random
 from datetime import datetime, date, timedelta
 from config import Config
+from sugar_score import score_glucose, score_from_stats
+import scoring_config
+from scoring_config import GRADING_MATRIX
+import rolling_grade
+import grade_cache
+import user_cache
+import synthetic_data
+import metrics
+import passwords
+import numpy as np
+from flask import g, has_app_context
 import random
 from datetime import datetime, timedelta
-import statistics
 import pprint
 
 
-def get_conn():
-    conn = sqlite3.connect(Config.DB_PATH)
+_local = threading.local()
+
+
+def _open_conn():
+    """
+    Open a new sqlite connection with WAL and the tuning pragmas from Config
+    (statement-timed by metrics.InstrumentedConnection when metrics or the
+    slow-query log are on).
+    """
+    instrumented = Config.METRICS_ENABLED or Config.SLOW_QUERY_MS > 0
+    factory = metrics.InstrumentedConnection if instrumented else sqlite3.Connection
+    conn = sqlite3.connect(Config.DB_PATH, timeout=Config.SQLITE_BUSY_TIMEOUT_MS / 1000, factory=factory)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size={int(Config.SQLITE_CACHE_SIZE)}")
+    conn.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def get_conn():
+    """
+    Return the shared connection for the current request (inside a Flask
+    app context) or for the current thread (scripts, background jobs).
+    Callers must not close it; close_conn() does that on teardown.
+    """
+    if has_app_context():
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = _open_conn()
+        return conn
+
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _open_conn()
     return conn
 
 
+def close_conn(exc=None):
+    """Close the request/thread connection. Registered as an app teardown handler."""
+    conn = g.pop("_db_conn", None) if has_app_context() else None
+    if conn is None:
+        conn = getattr(_local, "conn", None)
+        _local.conn = None
+    if conn is not None:
+        conn.close()
+
+
+# Upper bound for open-ended ts ranges (9999-12-31 23:59:59)
+MAX_TS = 253402300799
+
+
+def to_ts(dt: datetime) -> int:
+    """
+    Epoch seconds for a naive datetime, read as UTC. This is the same
+    mapping SQLite's strftime('%s', date || ' ' || time) uses, so ts order
+    matches the order of the stored date/time strings.
+    """
+    return calendar.timegm(dt.timetuple())
+
+
+def slot_ts(date_str: str, time_str: str) -> int:
+    """ts value for a stored (YYYY-MM-DD, HH:MM) slot."""
+    return to_ts(datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M"))
+
+
+def migrate_reading_ts(conn):
+    """
+    Add the integer ts column and (user_id, ts) index to fitbit_steps and
+    libre_glucose, backfilling ts for rows written before the column existed.
+    """
+    c = conn.cursor()
+    for table in ("fitbit_steps", "libre_glucose"):
+        cols = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+        if "ts" not in cols:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN ts INTEGER")
+        c.execute(f"""
+            UPDATE {table}
+            SET ts = CAST(strftime('%s', date || ' ' || time) AS INTEGER)
+            WHERE ts IS NULL
+        """)
+        c.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_user_ts ON {table}(user_id, ts)")
+    conn.commit()
+
+
 def init_db():
     with get_conn() as conn:
         c = conn.cursor()
@@ -41,6 +131,7 @@ def init_db():
                 date TEXT NOT NULL,       -- YYYY-MM-DD
                 time TEXT NOT NULL,       -- HH:MM
                 steps INTEGER NOT NULL,
+                ts INTEGER,               -- epoch seconds of date+time
                 UNIQUE(user_id, date, time),
                 FOREIGN KEY(user_id) REFERENCES users(user_id)
             )
@@ -52,11 +143,117 @@ def init_db():
                 date TEXT NOT NULL,      -- YYYY-MM-DD
                 time TEXT NOT NULL,      -- HH:MM
                 glucose REAL NOT NULL,
+                ts INTEGER,              -- epoch seconds of date+time
+                backfilled INTEGER NOT NULL DEFAULT 0,   -- 1 = placeholder from backfill_libre_glucose
                 UNIQUE(user_id, date, time),
                 FOREIGN KEY(user_id) REFERENCES users(user_id)
             )
         """)
 
+        migrate_reading_ts(conn)
+        cols = {r[1] for r in c.execute("PRAGMA table_info(libre_glucose)")}
+        if "backfilled" not in cols:
+            c.execute("ALTER TABLE libre_glucose ADD COLUMN backfilled INTEGER NOT NULL DEFAULT 0")
+        # Per-user "rows since id N" lookups (rolling_grade.apply_new_readings)
+        c.execute("CREATE INDEX IF NOT EXISTS ix_libre_glucose_user_id ON libre_glucose(user_id, id)")
+
+        # --- Rolling-window grade state (see rolling_grade.py) ---
+        # Derived data: a table from before the exact-sum columns is dropped
+        # and refilled by the next glucose write.
+        cols = {r[1] for r in c.execute("PRAGMA table_info(grade_state)")}
+        if cols and "sumsq" not in cols:
+            c.execute("DROP TABLE grade_state")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS grade_state (
+                user_id INTEGER NOT NULL,
+                window_hours INTEGER NOT NULL,
+                window_start INTEGER NOT NULL,   -- ts of the oldest slot in the window
+                last_id INTEGER NOT NULL,        -- highest libre_glucose.id applied
+                last_ts INTEGER,
+                last_value REAL,
+                count INTEGER NOT NULL,
+                sum INTEGER NOT NULL,            -- of the integer-valued readings
+                sumsq INTEGER NOT NULL,          -- sum of their squares
+                non_int INTEGER NOT NULL,        -- readings with a fractional part
+                in_range INTEGER NOT NULL,
+                spikes INTEGER NOT NULL,
+                PRIMARY KEY (user_id, window_hours)
+            )
+        """)
+
+        # --- Grade cache (see grade_cache.py) ---
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS grade_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL      -- bumped on every glucose write
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS grade_cache (
+                user_id INTEGER NOT NULL,
+                window_hours INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                result TEXT NOT NULL,         -- JSON result dict
+                PRIMARY KEY (user_id, window_hours)
+            )
+        """)
+
+        # --- Nightly batch grades (see batch_grade.py) ---
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS sugar_grades (
+                user_id INTEGER NOT NULL,
+                window_hours INTEGER NOT NULL,
+                graded_at TEXT NOT NULL,      -- YYYY-MM-DD HH:MM:SS
+                tir_percent REAL NOT NULL,
+                tir_score INTEGER NOT NULL,
+                variability REAL NOT NULL,
+                variability_score INTEGER NOT NULL,
+                avg_glucose INTEGER NOT NULL,
+                avg_score INTEGER NOT NULL,
+                spike_count INTEGER NOT NULL,
+                spike_score INTEGER NOT NULL,
+                final_score INTEGER NOT NULL,
+                grade INTEGER,
+                interpretation TEXT NOT NULL,
+                suggested_actions TEXT NOT NULL,
+                PRIMARY KEY (user_id, window_hours, graded_at),
+                FOREIGN KEY(user_id) REFERENCES users(user_id)
+            )
+        """)
+
+        # --- Shared Spike access tokens (see spike_tokens.py) ---
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS spike_tokens (
+                user_id INTEGER PRIMARY KEY,
+                access_token TEXT,
+                expires_at REAL NOT NULL DEFAULT 0,    -- epoch seconds
+                lease_until REAL NOT NULL DEFAULT 0,   -- refresh in progress until
+                FOREIGN KEY(user_id) REFERENCES users(user_id)
+            )
+        """)
+
+        # --- Background Spike sync cursors (see sync_worker.py) ---
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                user_id INTEGER NOT NULL,
+                provider TEXT NOT NULL,        -- fitbit | libre
+                metric TEXT NOT NULL,          -- steps | glucose
+                last_ts INTEGER,               -- newest reading ingested, epoch seconds
+                last_synced_at TEXT,           -- YYYY-MM-DD HH:MM:SS (UTC)
+                last_error TEXT,
+                PRIMARY KEY (user_id, provider, metric),
+                FOREIGN KEY(user_id) REFERENCES users(user_id)
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS sync_lease (
+                name TEXT PRIMARY KEY,         -- always 'spike-sync'
+                owner TEXT,                    -- host:pid:thread running cycles
+                expires_at REAL NOT NULL DEFAULT 0   -- epoch seconds
+            )
+        """)
+
         # --- Grading Matrix table ---
         c.execute("""
             CREATE TABLE IF NOT EXISTS grading_matrix (
@@ -71,24 +268,15 @@ def init_db():
         # Seed grading matrix if empty
         c.execute("SELECT COUNT(*) FROM grading_matrix")
         if c.fetchone()[0] == 0:
-            grading_matrix = [
-                (85, 100, 10, "Excellent", "Maintain current habits, keep consistent."),
-                (75, 84, 9, "Very Good", "Minor adjustments; consider maintaining low-carb options."),
-                (65, 74, 8, "Good", "Small improvements, e.g., adding fiber and lean protein to meals."),
-                (55, 64, 7, "Fair", "Focus on stable meal timings, avoid high-GI foods."),
-                (45, 54, 6, "Satisfactory", "Begin making meal adjustments to reduce variability and spikes."),
-                (35, 44, 5, "Moderate", "Moderate improvements; reduce carbs at high-variance meals."),
-                (25, 34, 4, "Needs Improvement", "Reduce large spikes; add low-GI foods and consider exercise adjustments."),
-                (15, 24, 3, "Poor", "Re-evaluate meal composition; replace carbs with high-quality proteins."),
-                (5, 14, 2, "Very Poor", "Major changes needed; focus on protein, fiber, and activity level."),
-                (0, 4, 1, "Critical", "Significant intervention; low-carb focus, avoid all high-GI foods."),
-            ]
             c.executemany("""
                 INSERT INTO grading_matrix (score_min, score_max, grade, interpretation, suggested_actions)
                 VALUES (?, ?, ?, ?, ?)
-            """, grading_matrix)
+            """, GRADING_MATRIX)
             print("🌱 Seeded grading_matrix table.")
 
+        # --- Score bands, weights and their version triggers ---
+        scoring_config.seed_tables(conn)
+
 
         c.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email ON users(email)")
         conn.commit()
@@ -126,12 +314,13 @@ def create_user(name: str, email: str, dob: str, gender: str, password: str, con
         return False, "Password must be at least 6 characters."
 
     salt_hex = secrets.token_hex(16)
-    pwd_hash = hash_password(password, salt_hex)
+    try:
+        pwd_hash = hash_password(password, salt_hex)
+    except passwords.HashingBusy:
+        return False, "We're handling a lot of sign-ups right now. Please try again in a moment."
 
-    close_after = False
     if conn is None:
         conn = get_conn()
-        close_after = True
 
     try:
         c = conn.cursor()
@@ -140,15 +329,15 @@ def create_user(name: str, email: str, dob: str, gender: str, password: str, con
             VALUES (?, ?, ?, ?, ?, ?)
         """, (name, email, dob, gender, pwd_hash, salt_hex))
         conn.commit()
+        user_cache.invalidate(c.lastrowid)
         return True, None
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False, "An account with this email already exists."
-    finally:
-        if close_after:
-            conn.close()
 
 
 def get_user_by_email(email: str):
+    """Full row, credentials included; for sign-in only, so never cached."""
     with get_conn() as conn:
         c = conn.cursor()
         c.execute("SELECT * FROM users WHERE email = ?", ((email or "").lower(),))
@@ -156,21 +345,52 @@ def get_user_by_email(email: str):
 
 
 def get_user_by_id(user_id: int):
+    """Display fields only (see user_cache.PROFILE_FIELDS), served from the profile cache."""
+    profile = user_cache.get(user_id)
+    if profile is not None:
+        return profile
     with get_conn() as conn:
         c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        return c.fetchone()
+        c.execute(f"SELECT {', '.join(user_cache.PROFILE_FIELDS)} FROM users WHERE user_id = ?", (user_id,))
+        row = c.fetchone()
+    return user_cache.put(user_id, row) if row else None
 
 
-def hash_password(password: str, salt_hex: str) -> str:
-    salt_bytes = bytes.fromhex(salt_hex)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt_bytes, 100_000)
-    return dk.hex()
+def hash_password(password: str, salt_hex: str = None) -> str:
+    """Self-describing PBKDF2 hash, computed in the passwords pool (may raise HashingBusy)."""
+    return passwords.hash_password(password, salt_hex)
 
 
 def verify_password(stored_hash: str, salt_hex: str, password: str) -> bool:
-    test_hash = hash_password(password, salt_hex)
-    return hmac.compare_digest(stored_hash, test_hash)
+    return passwords.verify(stored_hash, salt_hex, password)[0]
+
+
+def authenticate(email: str, password: str, conn=None):
+    """
+    Return the user row if the password matches, else None. Hashes stored
+    with old parameters are upgraded in place when the pool has room; only
+    the check itself may raise HashingBusy.
+    """
+    user = get_user_by_email(email)
+    if not user:
+        return None
+    ok, needs_rehash = passwords.verify(user["password_hash"], user["salt"], password)
+    if not ok:
+        return None
+    if needs_rehash:
+        try:
+            new_hash = passwords.hash_password(password)
+        except passwords.HashingBusy:
+            new_hash = None     # best effort: upgrade on a later login
+        if new_hash:
+            if conn is None:
+                conn = get_conn()
+            with conn:
+                conn.execute("UPDATE users SET password_hash = ?, salt = ? WHERE user_id = ?",
+                             (new_hash, passwords.salt_of(new_hash), user["user_id"]))
+    # The dashboard comes next; have its profile ready
+    user_cache.put(user["user_id"], user)
+    return user
 
 
 def valid_email(email: str) -> bool:
@@ -189,21 +409,15 @@ def add_fitbit_step(user_id: int, date: str, time: str, steps: int, conn=None):
     Insert a step value if not already stored (no duplicates).
     Uses UNIQUE(user_id, date, time) constraint.
     """
-    close_after = False
     if conn is None:
         conn = get_conn()
-        close_after = True
 
-    try:
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR IGNORE INTO fitbit_steps (user_id, date, time, steps)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, date, time, steps))
-        conn.commit()
-    finally:
-        if close_after:
-            conn.close()
+    c = conn.cursor()
+    c.execute("""
+        INSERT OR IGNORE INTO fitbit_steps (user_id, date, time, steps, ts)
+        VALUES (?, ?, ?, ?, ?)
+    """, (user_id, date, time, steps, slot_ts(date, time)))
+    conn.commit()
 
 
 def get_fitbit_steps(user_id: int, since_days: int = 7):
@@ -211,36 +425,136 @@ def get_fitbit_steps(user_id: int, since_days: int = 7):
     Get stored Fitbit steps for a user over the last N days.
     Returns list of dicts {date, time, steps}.
     """
-    cutoff_date = (date.today() - timedelta(days=since_days)).isoformat()
+    cutoff_date = date.today() - timedelta(days=since_days)
+    from_ts = to_ts(datetime.combine(cutoff_date, datetime.min.time()))
     with get_conn() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT date, time, steps
             FROM fitbit_steps
-            WHERE user_id = ? AND date >= ?
+            WHERE user_id = ? AND ts BETWEEN ? AND ?
             ORDER BY date DESC, time ASC
-        """, (user_id, cutoff_date))
+        """, (user_id, from_ts, MAX_TS))
         rows = c.fetchall()
         return [dict(r) for r in rows]
     
+# Real readings overwrite backfill_libre_glucose placeholders; anything else is a duplicate.
+REPLACE_BACKFILLED = """
+    DO UPDATE SET glucose = excluded.glucose, backfilled = 0
+    WHERE libre_glucose.backfilled = 1
+"""
+
+
 def add_libre_glucose(user_id: int, date: str, time: str, glucose: float, conn=None):
     """
-    Insert a Libre glucose reading. Avoid duplicates by UNIQUE(user_id,date,time).
+    Insert a Libre glucose reading. Avoid duplicates by UNIQUE(user_id,date,time);
+    a backfilled placeholder in the slot is replaced.
     """
-    close_after = False
     if conn is None:
         conn = get_conn()
-        close_after = True
-    try:
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR IGNORE INTO libre_glucose (user_id, date, time, glucose)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, date, time, glucose))
-        conn.commit()
-    finally:
-        if close_after:
-            conn.close()
+    c = conn.cursor()
+    replaces = c.execute("""
+        SELECT 1 FROM libre_glucose WHERE user_id = ? AND date = ? AND time = ? AND backfilled = 1
+    """, (user_id, date, time)).fetchone() is not None
+    c.execute(f"""
+        INSERT INTO libre_glucose (user_id, date, time, glucose, ts)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, date, time) {REPLACE_BACKFILLED}
+    """, (user_id, date, time, glucose, slot_ts(date, time)))
+    if c.rowcount:
+        _on_new_glucose(conn, user_id, rebuild=replaces)
+    conn.commit()
+
+
+def _on_new_glucose(conn, user_id: int, rebuild: bool = False):
+    """
+    Keep derived grade data in step with libre_glucose writes (caller commits).
+    rebuild=True when existing rows changed value (replaced placeholders).
+    """
+    rolling_grade.apply_new_readings(conn, user_id, Config.GRADE_WINDOW_HOURS, rebuild=rebuild)
+    grade_cache.bump_version(conn, user_id)
+
+
+def iter_spike_readings(payload):
+    """
+    Decode a Spike /queries/timeseries payload into (date, time, value) tuples.
+    Offsets are milliseconds from "from_timestamp"; slots without a value are skipped.
+    """
+    if not isinstance(payload, dict) or "values" not in payload:
+        return
+    base = datetime.fromisoformat(payload["from_timestamp"].replace("Z", "+00:00"))
+    for offset, value in zip(payload.get("offsets") or [], payload["values"]):
+        if value is None:
+            continue
+        ts = base + timedelta(milliseconds=offset)
+        yield ts.strftime("%Y-%m-%d"), ts.strftime("%H:%M"), value
+
+
+def _bulk_insert_readings(table: str, column: str, cast, user_id: int, readings, conn=None,
+                          on_conflict: str = "DO NOTHING"):
+    """
+    Write many (date, time, value) readings with one prepared executemany
+    in a single transaction. `readings` is either a decoded Spike payload
+    or any iterable of (date, time, value) tuples.
+    Returns (written, skipped); duplicates are skipped by UNIQUE(user_id,date,time)
+    unless on_conflict updates them.
+    """
+    if isinstance(readings, dict):
+        readings = iter_spike_readings(readings)
+    rows = [(user_id, d, t, cast(v), slot_ts(d, t)) for d, t, v in readings]
+    if not rows:
+        return 0, 0
+
+    if conn is None:
+        conn = get_conn()
+
+    before = conn.total_changes
+    with conn:
+        conn.executemany(f"""
+            INSERT INTO {table} (user_id, date, time, {column}, ts)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, date, time) {on_conflict}
+        """, rows)
+    inserted = conn.total_changes - before
+    return inserted, len(rows) - inserted
+
+
+def add_fitbit_steps_bulk(user_id: int, readings, conn=None):
+    """
+    Bulk version of add_fitbit_step for a whole Spike steps payload.
+    Returns (inserted, skipped).
+    """
+    return _bulk_insert_readings("fitbit_steps", "steps", int, user_id, readings, conn=conn)
+
+
+def add_libre_glucose_bulk(user_id: int, readings, conn=None):
+    """
+    Bulk version of add_libre_glucose for a whole Spike glucose payload.
+    Backfilled placeholders in the same slots are replaced.
+    Returns (inserted, skipped); replaced placeholders count as inserted.
+    """
+    if isinstance(readings, dict):
+        readings = iter_spike_readings(readings)
+    readings = list(readings)
+    if not readings:
+        return 0, 0
+    if conn is None:
+        conn = get_conn()
+
+    span = [slot_ts(d, t) for d, t, _ in readings]
+    placeholders = """
+        SELECT COUNT(*) FROM libre_glucose
+        WHERE user_id = ? AND ts BETWEEN ? AND ? AND backfilled = 1
+    """
+    span_args = (user_id, min(span), max(span))
+    before = conn.execute(placeholders, span_args).fetchone()[0]
+    inserted, skipped = _bulk_insert_readings("libre_glucose", "glucose", float, user_id, readings,
+                                              conn=conn, on_conflict=REPLACE_BACKFILLED)
+    if inserted:
+        replaced = before > 0 and conn.execute(placeholders, span_args).fetchone()[0] < before
+        with conn:
+            _on_new_glucose(conn, user_id, rebuild=replaced)
+    return inserted, skipped
 
 
 def get_libre_glucose(user_id: int, hours: int = 48):
@@ -248,16 +562,16 @@ def get_libre_glucose(user_id: int, hours: int = 48):
     Get Libre readings for the last N hours, ordered by date/time.
     """
     cutoff_dt = datetime.now() - timedelta(hours=hours)
-    cutoff_str = cutoff_dt.strftime("%Y-%m-%d %H:%M")
+    from_ts = to_ts(cutoff_dt.replace(second=0, microsecond=0))
 
     with get_conn() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT date, time, glucose
             FROM libre_glucose
-            WHERE user_id = ? AND (date || ' ' || time) >= ?
-            ORDER BY date ASC, time ASC
-        """, (user_id, cutoff_str))
+            WHERE user_id = ? AND ts BETWEEN ? AND ?
+            ORDER BY ts ASC
+        """, (user_id, from_ts, MAX_TS))
         return [dict(r) for r in c.fetchall()]
 
 def floor_to_15min(dt):
@@ -266,12 +580,14 @@ def floor_to_15min(dt):
 
 
 
-def seed_fake_libre(user_id: int, days: int = 1, meals=None):
+def seed_fake_libre(user_id: int, days: int = 1, meals=None, seed=None, conn=None):
     """
     Generate more realistic Libre-style glucose data.
     - Baseline: 90 mg/dL
-    - Meals add spikes of +20-40, decaying back in 2h
+    - Meals add spikes of +25-40, decaying back in 2h
     - Save every 15 minutes
+    Values come from synthetic_data.glucose_values and are written in one
+    bulk insert; pass a seed for repeatable data.
     """
 
     # Define typical meal times if none given
@@ -279,40 +595,10 @@ def seed_fake_libre(user_id: int, days: int = 1, meals=None):
         meals = [8, 13, 19]  # breakfast 8am, lunch 1pm, dinner 7pm
 
     now = floor_to_15min(datetime.now())
-    start = now - timedelta(days=days)
-    current = start
-
-    # baseline fasting level
-    baseline = 90  
-    inserted = 0
-
-    while current <= now:
-        hour = current.hour
-        val = baseline
-
-        # Add meal-driven spikes
-        for meal_hr in meals:
-            # if we are within 2h after a meal time
-            if meal_hr <= hour < meal_hr+2:
-                # simulate highest spike just after meal, then decay
-                minutes_since_meal = (hour - meal_hr) * 60 + current.minute
-                peak = random.randint(25, 40)  # spike magnitude
-                decay = max(0, peak - (minutes_since_meal * (peak/120)))  # linear decay over 2h
-                val += int(decay)
-
-        # add tiny random jitter (+/-5 mg/dL) for realism
-        val += random.randint(-5, 5)
-
-        # store in DB
-        add_libre_glucose(
-            user_id,
-            current.strftime("%Y-%m-%d"),
-            current.strftime("%H:%M"),
-            val
-        )
-        inserted += 1
-        current += timedelta(minutes=15)
+    grid = synthetic_data.SlotGrid(now - timedelta(days=days), now, 15)
+    values = synthetic_data.glucose_values(np.random.default_rng(seed), 1, grid, meals=meals)[0]
 
+    inserted, _ = add_libre_glucose_bulk(user_id, zip(grid.dates, grid.times, values.tolist()), conn=conn)
     print(f"✅ Inserted {inserted} realistic Libre readings for user {user_id}.")
 
 
@@ -322,100 +608,47 @@ import pprint   # at top of file
 def calculate_sugar_grade(user_id: int, hours: int = 48):
     """
     Calculate sugar grading metrics for a given user_id over the last N hours (default: 48h).
-    Reads from libre_glucose table and grading_matrix in users_web.db
+    Reads from libre_glucose table and grading_matrix in users_web.db;
+    the scoring itself is sugar_score.score_glucose.
     """
     with get_conn() as conn:
         c = conn.cursor()
 
+        version = grade_cache.current_version(conn, user_id)
+        cached = grade_cache.get(conn, user_id, hours, version)
+        if cached is not None:
+            return cached
+
         from_dt = datetime.now() - timedelta(hours=hours)
+        from_ts = to_ts(from_dt.replace(second=0, microsecond=0))
 
-        c.execute("""
-            SELECT glucose FROM libre_glucose
-            WHERE user_id=? AND date || ' ' || time >= ?
-            ORDER BY date, time
-        """, (user_id, from_dt.strftime("%Y-%m-%d %H:%M")))
+        config = scoring_config.load(conn)
 
-        rows = c.fetchall()
-        glucose_values = [r[0] for r in rows]
-
-        if not glucose_values:
-            return None
-
-        # --- all your scoring exactly as you had ---
-        in_range_count = sum(1 for v in glucose_values if 70 <= v <= 150)
-        tir_percent = (in_range_count / len(glucose_values)) * 100
-        if tir_percent >= 90: tir_score = 100
-        elif tir_percent >= 80: tir_score = 90
-        elif tir_percent >= 70: tir_score = 80
-        elif tir_percent >= 60: tir_score = 70
-        else:
-            reduction = int((60 - tir_percent) // 10) * 10
-            tir_score = max(0, 70 - reduction)
-
-        mean_glucose = statistics.mean(glucose_values)
-        std_dev = statistics.stdev(glucose_values) if len(glucose_values) > 1 else 0
-        cv = (std_dev / mean_glucose) * 100 if mean_glucose else 0
-        if 10 <= cv <= 20: variability_score = 100
-        elif 21 <= cv <= 30: variability_score = 80
-        elif 31 <= cv <= 40: variability_score = 60
-        elif 41 <= cv <= 50: variability_score = 40
-        else: variability_score = 20
-
-        avg_glucose = round(mean_glucose)
-        if 90 <= avg_glucose <= 110: avg_score = 100
-        elif 111 <= avg_glucose <= 130: avg_score = 90
-        elif 131 <= avg_glucose <= 150: avg_score = 70
-        elif 151 <= avg_glucose <= 170: avg_score = 50
-        else: avg_score = 30
-
-        spike_count = 0
-        last = None
-        for g in glucose_values:
-            if last is not None and (g - last) > 30:
-                spike_count += 1
-            last = g
-
-        if spike_count == 0: spike_score = 100
-        elif spike_count == 1: spike_score = 80
-        elif spike_count == 2: spike_score = 60
-        elif spike_count == 3: spike_score = 40
-        else: spike_score = 20
-
-        final_score = round(
-            (tir_score * 0.35) +
-            (variability_score * 0.25) +
-            (avg_score * 0.25) +
-            (spike_score * 0.15)
-        )
+        stats = None
+        if hours == Config.GRADE_WINDOW_HOURS:
+            # O(1): read the rolling state kept up to date by the insert paths
+            state = rolling_grade.read_state(conn, user_id, hours, from_ts)
+            if not state["count"]:
+                return None
+            stats = rolling_grade.state_stats(state)  # None if it holds non-integer readings
 
-        c.execute("""
-            SELECT grade, interpretation, suggested_actions
-            FROM grading_matrix
-            WHERE ? BETWEEN score_min AND score_max
-        """, (final_score,))
-        result = c.fetchone()
-
-        if result:
-            grade, interpretation, actions = result
+        if stats is not None:
+            result_dict = score_from_stats(*stats, config=config)
         else:
-            grade, interpretation, actions = (None, "Unknown", "No suggestions")
-
-        # --- Build and print result dict ---
-        result_dict = {
-            "tir_percent": round(tir_percent, 2),
-            "tir_score": tir_score,
-            "variability": round(cv, 2),
-            "variability_score": variability_score,
-            "avg_glucose": avg_glucose,
-            "avg_score": avg_score,
-            "spike_count": spike_count,
-            "spike_score": spike_score,
-            "final_score": final_score,
-            "grade": grade,
-            "interpretation": interpretation,
-            "suggested_actions": actions
-        }
+            c.execute("""
+                SELECT glucose FROM libre_glucose
+                WHERE user_id=? AND ts BETWEEN ? AND ?
+                ORDER BY ts
+            """, (user_id, from_ts, MAX_TS))
+
+            glucose_values = [r[0] for r in c.fetchall()]
+            if not glucose_values:
+                return None
+            result_dict = score_glucose(glucose_values, config=config)
 
+        grade_cache.put(conn, user_id, hours, version, result_dict)
+
+        # --- Print result dict ---
         print("\n=== Sugar Grade Calculation for user", user_id, " ===", flush=True)
         pprint.pprint(result_dict, indent=2)   # pretty output
         print("====================================================\n", flush=True)
@@ -426,45 +659,57 @@ def calculate_sugar_grade(user_id: int, hours: int = 48):
 
 import random
 
-def backfill_libre_glucose(user_id: int, hours: int = 48):
+def backfill_libre_glucose(user_id: int, hours: int = 48, conn=None):
     """
     Ensure every 15-min slot in the last N hours exists for this user.
     Missing slots are filled with 'realistic' baseline values.
+    Only slots older than the user's Libre sync cursor are filled, so a
+    user who has never synced gets nothing; the rows are marked backfilled
+    and real readings for the same slot replace them. The slot grid is
+    built in one pass and written with a single executemany; existing
+    slots are left alone by ON CONFLICT DO NOTHING.
+    Returns the number of slots filled.
     """
+    if conn is None:
+        conn = get_conn()
+    cursor = conn.execute("""
+        SELECT last_ts FROM sync_cursors
+        WHERE user_id = ? AND provider = 'libre' AND metric = 'glucose'
+    """, (user_id,)).fetchone()
+    if cursor is None or cursor[0] is None:
+        return 0
+    synced_to = cursor[0]
+
     now = floor_to_15min(datetime.now())
     start = now - timedelta(hours=hours)
-
-    current = start
     baseline = 95
 
-    with get_conn() as conn:
-        c = conn.cursor()
-        while current <= now:
-            date_str = current.strftime("%Y-%m-%d")
-            time_str = current.strftime("%H:%M")
-
-            # check if this slot already exists
-            c.execute("""
-                SELECT 1 FROM libre_glucose
-                WHERE user_id=? AND date=? AND time=?
-                """, (user_id, date_str, time_str))
-            exists = c.fetchone()
-
-            if not exists:
-                # generate a realistic-ish glucose value
-                # - stable overnight
-                # - small bumps around common meals (8a, 1p, 7p)
-                val = baseline + random.randint(-5, 5)
-                if current.hour in (8, 9):  # breakfast spike
-                    val += random.randint(20, 35)
-                elif current.hour in (13, 14):  # lunch spike
-                    val += random.randint(20, 40)
-                elif current.hour in (19, 20):  # dinner spike
-                    val += random.randint(25, 45)
-
-                c.execute("""
-                    INSERT INTO libre_glucose (user_id, date, time, glucose)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, date_str, time_str, val))
-            current += timedelta(minutes=15)
-        conn.commit()
+    slots = []
+    current = start
+    while current <= now and to_ts(current) < synced_to:
+        # generate a realistic-ish glucose value
+        # - stable overnight
+        # - small bumps around common meals (8a, 1p, 7p)
+        val = baseline + random.randint(-5, 5)
+        if current.hour in (8, 9):  # breakfast spike
+            val += random.randint(20, 35)
+        elif current.hour in (13, 14):  # lunch spike
+            val += random.randint(20, 40)
+        elif current.hour in (19, 20):  # dinner spike
+            val += random.randint(25, 45)
+        slots.append((user_id, current.strftime("%Y-%m-%d"), current.strftime("%H:%M"), val, to_ts(current)))
+        current += timedelta(minutes=15)
+    if not slots:
+        return 0
+
+    before = conn.total_changes
+    with conn:
+        conn.executemany("""
+            INSERT INTO libre_glucose (user_id, date, time, glucose, ts, backfilled)
+            VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT(user_id, date, time) DO NOTHING
+        """, slots)
+        filled = conn.total_changes - before
+        if filled:
+            _on_new_glucose(conn, user_id)
+    return filled
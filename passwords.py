@@ -0,0 +1,114 @@
+"""
+Password hashing off the request threads.
+
+PBKDF2 runs in a small dedicated process pool (PASSWORD_HASH_WORKERS), so a
+burst of sign-ins costs pool time instead of request-thread CPU. At most
+PASSWORD_HASH_MAX_PENDING hashes may be queued or running; beyond that
+hash_password()/verify() raise HashingBusy immediately and the caller answers 503,
+which keeps a login storm from starving every other route.
+
+Hashes are stored self-describing as
+    pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+Rows from before this format (bare hex hash, salt in users.salt, 100k
+iterations) still verify, and verify() reports needs_rehash for them and for
+any hash whose iterations differ from PASSWORD_ITERATIONS, so callers can
+upgrade it on the next successful login.
+"""
+import hashlib
+import hmac
+import multiprocessing
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from config import Config
+
+ALGORITHM = "pbkdf2_sha256"
+LEGACY_ITERATIONS = 100_000
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+class HashingBusy(Exception):
+    """Too many password hashes in flight; try again shortly."""
+
+
+def _pbkdf2(password: str, salt_hex: str, iterations: int) -> str:
+    """Worker: runs in the hashing pool."""
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), iterations).hex()
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_MAX_PENDING)
+            # spawn, not fork: the pool is started from a threaded web worker
+            _pool = ProcessPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run(password: str, salt_hex: str, iterations: int) -> str:
+    if Config.PASSWORD_HASH_WORKERS <= 0:
+        return _pbkdf2(password, salt_hex, iterations)
+
+    pool = _get_pool()
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy("password hashing queue is full")
+    try:
+        future = pool.submit(_pbkdf2, password, salt_hex, iterations)
+    except Exception:
+        _slots.release()
+        raise
+    # The slot is freed when the hash finishes, even if we stop waiting for it
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        raise HashingBusy("password hashing timed out")
+
+
+def encode(iterations: int, salt_hex: str, hash_hex: str) -> str:
+    return f"{ALGORITHM}${iterations}${salt_hex}${hash_hex}"
+
+
+def parse(stored_hash: str, salt_hex: str = None):
+    """
+    (iterations, salt_hex, hash_hex) for a stored hash in either format, or
+    None if it is malformed or uses an algorithm we do not know.
+    """
+    if "$" in stored_hash:
+        parts = stored_hash.split("$")
+        if len(parts) != 4 or parts[0] != ALGORITHM or not parts[1].isdigit():
+            return None
+        return int(parts[1]), parts[2], parts[3]
+    return LEGACY_ITERATIONS, salt_hex, stored_hash
+
+
+def hash_password(password: str, salt_hex: str = None, iterations: int = None) -> str:
+    """Hash a password with the current parameters. Raises HashingBusy under overload."""
+    salt_hex = salt_hex or secrets.token_hex(16)
+    iterations = iterations or Config.PASSWORD_ITERATIONS
+    return encode(iterations, salt_hex, _run(password, salt_hex, iterations))
+
+
+def verify(stored_hash: str, salt_hex: str, password: str):
+    """
+    Check a password against a stored hash. Returns (ok, needs_rehash);
+    a hash parse() cannot read never matches. Raises HashingBusy under overload.
+    """
+    parsed = parse(stored_hash, salt_hex)
+    if parsed is None:
+        return False, False
+    iterations, salt, digest = parsed
+    ok = hmac.compare_digest(digest, _run(password, salt, iterations))
+    needs_rehash = ok and ("$" not in stored_hash or iterations != Config.PASSWORD_ITERATIONS)
+    return ok, needs_rehash
+
+
+def salt_of(stored_hash: str) -> str:
+    """The salt embedded in an encoded hash (kept in users.salt as well)."""
+    return parse(stored_hash)[1]
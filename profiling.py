@@ -0,0 +1,263 @@
+"""
+On-demand request profiling and the sqlite slow-query log.
+
+A request is profiled when it carries a valid signed X-Profile header or is
+picked by PROFILE_SAMPLE_RATE. The header value is "<mode>:<expires>:<sig>",
+mode being cprofile or tracemalloc and sig the HMAC-SHA256 of
+"<mode>:<expires>" under PROFILE_SECRET; make one with
+`python profiling.py sign`. Each profiled request leaves a dump plus a .json
+sidecar (route, status, duration) in PROFILE_DIR. Only one request per
+mode is profiled at a time; others run normally.
+
+With SLOW_QUERY_MS > 0, statements slower than that on the instrumented
+connections (see metrics.InstrumentedConnection) are appended to
+PROFILE_DIR/slow_queries.jsonl with their parameters and duration.
+Statements touching credential tables (CREDENTIAL_TABLES) log only the
+type of each parameter, never password hashes, salts or Spike tokens.
+
+    python profiling.py sign --mode cprofile --ttl 600
+    python profiling.py list
+    python profiling.py show 20261018T124501_dashboard.libre_data_cprofile.prof --top 25
+    python profiling.py slow --top 10
+"""
+import argparse
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from config import Config
+
+MODES = ("cprofile", "tracemalloc")
+SLOW_LOG = "slow_queries.jsonl"
+CREDENTIAL_TABLES = re.compile(r"\b(users|spike_tokens)\b", re.IGNORECASE)
+
+_busy = {mode: threading.Lock() for mode in MODES}
+_slow_lock = threading.Lock()
+
+
+def sign(mode: str, expires: int, secret: str = None) -> str:
+    """X-Profile header value for `mode`, valid until the `expires` epoch second."""
+    secret = secret or Config.PROFILE_SECRET
+    sig = hmac.new(secret.encode(), f"{mode}:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{mode}:{expires}:{sig}"
+
+
+def requested_mode(header: str):
+    """The mode a signed X-Profile header asks for, or None if it is missing, expired or forged."""
+    if not header or not Config.PROFILE_SECRET:
+        return None
+    try:
+        mode, expires, sig = header.split(":")
+        expires = int(expires)
+    except ValueError:
+        return None
+    if mode not in MODES or expires < time.time():
+        return None
+    return mode if hmac.compare_digest(sign(mode, expires), header) else None
+
+
+def _dump_name(endpoint: str, mode: str) -> str:
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", endpoint or "unmatched")
+    return os.path.join(Config.PROFILE_DIR, f"{stamp}_{safe}_{mode}")
+
+
+def _start(mode: str):
+    if not _busy[mode].acquire(blocking=False):
+        return None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return mode, profiler, time.perf_counter()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(10)
+    return mode, (tracemalloc.take_snapshot(), started_tracing), time.perf_counter()
+
+
+def _finish(state, endpoint: str, method: str, path: str, status: int):
+    mode, handle, started = state
+    try:
+        duration_ms = (time.perf_counter() - started) * 1000
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        base = _dump_name(endpoint, mode)
+        meta = {"mode": mode, "endpoint": endpoint, "method": method, "path": path, "status": status,
+                "duration_ms": round(duration_ms, 2), "created_at": datetime.now().isoformat(timespec="seconds")}
+
+        if mode == "cprofile":
+            handle.disable()
+            meta["dump"] = os.path.basename(base + ".prof")
+            handle.dump_stats(base + ".prof")
+        else:
+            before, started_tracing = handle
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            meta["dump"] = os.path.basename(base + ".tracemalloc")
+            meta["top_allocations"] = [str(s) for s in after.compare_to(before, "lineno")[:25]]
+            after.dump(base + ".tracemalloc")
+
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+    finally:
+        _busy[mode].release()
+
+
+def _loggable_params(sql: str, parameters) -> str:
+    if isinstance(parameters, str):
+        return parameters
+    if CREDENTIAL_TABLES.search(sql):
+        values = parameters.values() if isinstance(parameters, dict) else parameters
+        return f"<{len(values)} redacted: {', '.join(type(v).__name__ for v in values)}>"
+    return repr(parameters)[:500]
+
+
+def log_slow_query(sql: str, parameters, seconds: float):
+    """Append one statement to the slow-query log (called by metrics.record_sql)."""
+    from flask import has_request_context, request
+
+    entry = {
+        "at": datetime.now().isoformat(timespec="milliseconds"),
+        "ms": round(seconds * 1000, 3),
+        "sql": " ".join(sql.split()),
+        "params": _loggable_params(sql, parameters),
+        "endpoint": request.endpoint if has_request_context() else None,
+    }
+    line = json.dumps(entry) + "\n"
+    with _slow_lock:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(Config.PROFILE_DIR, SLOW_LOG), "a") as f:
+            f.write(line)
+
+
+def init_app(app):
+    """Register the profiling hooks, only if a secret or a sample rate is configured."""
+    if not (Config.PROFILE_SECRET or Config.PROFILE_SAMPLE_RATE > 0):
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _maybe_profile():
+        mode = requested_mode(request.headers.get("X-Profile"))
+        if mode is None and Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+            mode = Config.PROFILE_SAMPLE_MODE
+        if mode:
+            g._profile = _start(mode)
+
+    @app.after_request
+    def _write_profile(response):
+        state = g.pop("_profile", None)
+        if state:
+            _finish(state, request.endpoint, request.method, request.path, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _release_profile(exc=None):
+        # after_request was skipped (unhandled error): still write the dump and free the slot
+        state = g.pop("_profile", None)
+        if state:
+            _finish(state, request.endpoint, request.method, request.path, 500)
+
+
+# --- CLI -------------------------------------------------------------------
+
+def _load_meta():
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    metas = []
+    for name in sorted(os.listdir(Config.PROFILE_DIR)):
+        if name.endswith(".json"):
+            with open(os.path.join(Config.PROFILE_DIR, name)) as f:
+                metas.append(json.load(f))
+    return metas
+
+
+def cmd_list(args):
+    metas = _load_meta()[-args.limit:]
+    if not metas:
+        print(f"No profiles in {Config.PROFILE_DIR}.")
+    for m in metas:
+        print(f"{m['created_at']}  {m['mode']:<11} {m['duration_ms']:>9.1f} ms  {m['status']}  "
+              f"{m['method']} {m['path']:<20} {m['dump']}")
+
+
+def cmd_show(args):
+    path = args.dump if os.path.exists(args.dump) else os.path.join(Config.PROFILE_DIR, args.dump)
+    if path.endswith(".prof"):
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(args.sort).print_stats(args.top)
+        print(out.getvalue())
+    elif path.endswith(".tracemalloc"):
+        with open(path[:-len(".tracemalloc")] + ".json") as f:
+            meta = json.load(f)
+        print(f"Allocation growth during {meta['method']} {meta['path']} ({meta['duration_ms']} ms):")
+        for line in meta["top_allocations"][:args.top]:
+            print(" ", line)
+        print("\nLargest live allocations at the end of the request:")
+        for stat in tracemalloc.Snapshot.load(path).statistics("lineno")[:args.top]:
+            print(" ", stat)
+    else:
+        sys.exit(f"Unknown dump type: {path}")
+
+
+def cmd_slow(args):
+    path = os.path.join(Config.PROFILE_DIR, SLOW_LOG)
+    if not os.path.exists(path):
+        print(f"No slow queries logged in {path}.")
+        return
+    groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            g = groups[entry["sql"]]
+            g["count"] += 1
+            g["total_ms"] += entry["ms"]
+            g["max_ms"] = max(g["max_ms"], entry["ms"])
+    ranked = sorted(groups.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)[:args.top]
+    for sql, g in ranked:
+        print(f"{g['count']:>6}x  total {g['total_ms']:>10.1f} ms  max {g['max_ms']:>8.1f} ms  {sql[:120]}")
+
+
+def cmd_sign(args):
+    if not Config.PROFILE_SECRET:
+        sys.exit("PROFILE_SECRET is not set.")
+    print(f"X-Profile: {sign(args.mode, int(time.time()) + args.ttl)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List and summarize request profiles and slow queries.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", help="list profile dumps")
+    p.add_argument("--limit", type=int, default=50)
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("show", help="summarize one dump")
+    p.add_argument("dump", help="file name in PROFILE_DIR (or a path)")
+    p.add_argument("--top", type=int, default=30)
+    p.add_argument("--sort", default="cumulative", help="pstats sort key for .prof dumps")
+    p.set_defaults(func=cmd_show)
+
+    p = sub.add_parser("slow", help="slow queries grouped by statement")
+    p.add_argument("--top", type=int, default=20)
+    p.set_defaults(func=cmd_slow)
+
+    p = sub.add_parser("sign", help="print a signed X-Profile header")
+    p.add_argument("--mode", choices=MODES, default="cprofile")
+    p.add_argument("--ttl", type=int, default=600, help="seconds the header stays valid")
+    p.set_defaults(func=cmd_sign)
+
+    args = parser.parse_args()
+    args.func(args)
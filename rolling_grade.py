@@ -0,0 +1,239 @@
+"""
+Per-user rolling-window grade state.
+
+grade_state holds, for each (user_id, window_hours), the running aggregates
+of every libre_glucose reading with ts >= window_start: count, exact integer
+sum and sum of squares, in-range count, spike count and the last reading.
+It tracks the highest libre_glucose.id of that user it has applied, so any
+writer's rows are picked up by apply_new_readings(), which reads only that
+user's newer rows through the (user_id, id) index. Readings that arrive out
+of order (older than the last applied one, e.g. backfill) trigger a rebuild
+from raw data. Rows without a ts are never counted.
+
+CGM readings are whole mg/dL values, so the sums stay exact and
+state_stats() gives the same mean and std dev as sugar_score.glucose_stats.
+Non-integer readings are only counted (non_int); a window holding any is
+scored from raw rows instead.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sugar_score import TIR_LOW, TIR_HIGH, SPIKE_DELTA, _sqrt_of_frac
+
+STATE_COLUMNS = (
+    "window_start", "last_id", "last_ts", "last_value",
+    "count", "sum", "sumsq", "non_int", "in_range", "spikes",
+)
+
+
+def _in_range(value) -> bool:
+    return TIR_LOW <= value <= TIR_HIGH
+
+
+def _load(conn, user_id: int, window_hours: int):
+    row = conn.execute(f"""
+        SELECT {", ".join(STATE_COLUMNS)}
+        FROM grade_state WHERE user_id = ? AND window_hours = ?
+    """, (user_id, window_hours)).fetchone()
+    return dict(zip(STATE_COLUMNS, row)) if row else None
+
+
+def _save(conn, user_id: int, window_hours: int, state: dict):
+    conn.execute(f"""
+        INSERT OR REPLACE INTO grade_state (user_id, window_hours, {", ".join(STATE_COLUMNS)})
+        VALUES (?, ?, {", ".join("?" for _ in STATE_COLUMNS)})
+    """, (user_id, window_hours, *(state[k] for k in STATE_COLUMNS)))
+
+
+def _add(state: dict, value: float, sign: int):
+    """Add (sign=1) or remove (sign=-1) one reading from the count and sums."""
+    state["count"] += sign
+    state["in_range"] += sign * _in_range(value)
+    if float(value).is_integer():
+        v = int(value)
+        state["sum"] += sign * v
+        state["sumsq"] += sign * v * v
+    else:
+        state["non_int"] += sign
+
+
+def _push(state: dict, ts: int, value: float):
+    """Add a reading newer than every reading already in the state."""
+    if state["last_value"] is not None and value - state["last_value"] > SPIKE_DELTA:
+        state["spikes"] += 1
+    _add(state, value, 1)
+    state["last_ts"] = ts
+    state["last_value"] = value
+
+
+def _pop(state: dict, value: float):
+    """Remove the oldest reading."""
+    _add(state, value, -1)
+    if state["count"] == 0:
+        state.update(spikes=0, last_ts=None, last_value=None)
+
+
+def _empty_state(window_start: int, last_id: int) -> dict:
+    return dict(window_start=window_start, last_id=last_id, last_ts=None, last_value=None,
+                count=0, sum=0, sumsq=0, non_int=0, in_range=0, spikes=0)
+
+
+def window_start_ts(window_hours: int, now: datetime = None) -> int:
+    """ts cutoff for a window, matching calculate_sugar_grade's minute-truncated cutoff."""
+    from models import to_ts
+    from_dt = (now or datetime.now()) - timedelta(hours=window_hours)
+    return to_ts(from_dt.replace(second=0, microsecond=0))
+
+
+def _compute(conn, user_id: int, window_start: int) -> dict:
+    """State for one user's window, counted from the raw libre_glucose rows."""
+    last_id = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM libre_glucose WHERE user_id = ?", (user_id,)).fetchone()[0]
+    rows = conn.execute("""
+        SELECT ts, glucose FROM libre_glucose
+        WHERE user_id = ? AND ts >= ? AND id <= ?
+        ORDER BY ts
+    """, (user_id, window_start, last_id)).fetchall()
+
+    state = _empty_state(window_start, last_id)
+    for ts, value in rows:
+        _push(state, ts, value)
+    return state
+
+
+def rebuild_state(conn, user_id: int, window_hours: int, window_start: int = None):
+    """Recompute and store one user's state from the raw rows in the window."""
+    if window_start is None:
+        window_start = window_start_ts(window_hours)
+    state = _compute(conn, user_id, window_start)
+    _save(conn, user_id, window_hours, state)
+    return state
+
+
+def _catch_up(conn, user_id: int, state: dict) -> bool:
+    """
+    Fold rows with id > state["last_id"] into state (in memory).
+    Returns False if one of them is older than the last applied reading,
+    in which case the state must be recomputed.
+    """
+    rows = conn.execute("""
+        SELECT id, ts, glucose FROM libre_glucose
+        WHERE user_id = ? AND id > ?    -- ix_libre_glucose_user_id: this user's new rows only
+          AND ts IS NOT NULL
+        ORDER BY ts
+    """, (user_id, state["last_id"])).fetchall()
+    if not rows:
+        return True
+
+    fresh = [r for r in rows if r[1] >= state["window_start"]]
+    if fresh and state["last_ts"] is not None and fresh[0][1] <= state["last_ts"]:
+        return False
+
+    for _, ts, value in fresh:
+        _push(state, ts, value)
+    state["last_id"] = max(state["last_id"], max(r[0] for r in rows))
+    return True
+
+
+def _expire(conn, user_id: int, state: dict, window_start: int):
+    """Drop readings older than window_start from state (in memory). Reads only the expired rows."""
+    expired = conn.execute("""
+        SELECT glucose FROM libre_glucose
+        WHERE user_id = ? AND ts >= ? AND ts < ? AND id <= ?
+        ORDER BY ts
+    """, (user_id, state["window_start"], window_start, state["last_id"])).fetchall()
+    if expired:
+        following = conn.execute("""
+            SELECT glucose FROM libre_glucose
+            WHERE user_id = ? AND ts >= ? AND id <= ?
+            ORDER BY ts LIMIT 1
+        """, (user_id, window_start, state["last_id"])).fetchone()
+        chain = [r[0] for r in expired] + ([following[0]] if following else [])
+        state["spikes"] -= sum(1 for a, b in zip(chain, chain[1:]) if b - a > SPIKE_DELTA)
+        for (value,) in expired:
+            _pop(state, value)
+    state["window_start"] = window_start
+
+
+def apply_new_readings(conn, user_id: int, window_hours: int = None, rebuild: bool = False):
+    """
+    Fold libre_glucose rows written since the last call into every stored
+    state of the user, plus window_hours (created if missing), and slide
+    each window to now. rebuild=True recounts from raw rows instead, for
+    writes that changed existing readings. Called from the glucose insert
+    paths; the caller commits.
+    """
+    windows = {r[0] for r in conn.execute(
+        "SELECT window_hours FROM grade_state WHERE user_id = ?", (user_id,))}
+    if window_hours is not None:
+        windows.add(window_hours)
+
+    for hours in sorted(windows):
+        window_start = window_start_ts(hours)
+        state = _load(conn, user_id, hours)
+        if (rebuild or state is None or window_start < state["window_start"]
+                or not _catch_up(conn, user_id, state)):
+            rebuild_state(conn, user_id, hours, window_start)
+            continue
+        _expire(conn, user_id, state, window_start)
+        _save(conn, user_id, hours, state)
+
+
+def read_state(conn, user_id: int, window_hours: int, window_start: int = None):
+    """
+    Return the user's state for the window ending now without writing
+    anything: rows added and readings expired since the last insert are
+    applied in memory. A user with no stored state yet is counted from
+    raw rows (the next glucose write stores it).
+    """
+    if window_start is None:
+        window_start = window_start_ts(window_hours)
+    state = _load(conn, user_id, window_hours)
+    if state is None or window_start < state["window_start"] or not _catch_up(conn, user_id, state):
+        return _compute(conn, user_id, window_start)
+    if window_start > state["window_start"]:
+        _expire(conn, user_id, state, window_start)
+    return state
+
+
+def state_stats(state: dict):
+    """
+    (count, mean, std_dev, in_range, spikes) for sugar_score.score_from_stats,
+    or None if the window is empty or holds non-integer readings (score those
+    from raw rows with score_glucose).
+    """
+    n = state["count"]
+    if not n or state["non_int"]:
+        return None
+    s1, s2 = int(state["sum"]), int(state["sumsq"])
+    mean = s1 / n
+    std_dev = _sqrt_of_frac(n * s2 - s1 * s1, n * (n - 1)) if n > 1 else 0
+    return n, mean, std_dev, state["in_range"], state["spikes"]
+
+
+def rebuild_all(conn, window_hours: int, user_id: int = None):
+    """Recompute grade_state from raw data for one user or every user with readings."""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM libre_glucose")]
+    window_start = window_start_ts(window_hours)
+    for uid in user_ids:
+        rebuild_state(conn, uid, window_hours, window_start)
+    conn.commit()
+    return len(user_ids)
+
+
+if __name__ == "__main__":
+    from config import Config
+    from models import get_conn, init_db
+
+    parser = argparse.ArgumentParser(description="Rebuild rolling grade state from libre_glucose.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", type=int, default=None, help="only this user_id")
+    parser.add_argument("--hours", type=int, default=Config.GRADE_WINDOW_HOURS)
+    args = parser.parse_args()
+
+    init_db()
+    n = rebuild_all(get_conn(), args.hours, args.user)
+    print(f"✅ Rebuilt grade state for {n} user(s), window={args.hours}h.")
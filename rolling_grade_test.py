@@ -0,0 +1,115 @@
+"""
+rolling_grade checks against a throwaway sqlite file: the incremental
+state must grade every window exactly like sugar_score.score_glucose on the
+raw rows, and reading it must not write.
+
+    python -m pytest -q rolling_grade_test.py
+    python rolling_grade_test.py
+"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from config import Config
+
+Config.DB_PATH = os.path.join(tempfile.mkdtemp(), "rolling_grade_test.db")
+
+import models
+import rolling_grade
+from sugar_score import score_from_stats, score_glucose
+
+HOURS = Config.GRADE_WINDOW_HOURS
+
+
+def _slots(now, hours):
+    """Every 15-minute slot of the last `hours` hours as (date, time)."""
+    start = models.floor_to_15min(now - timedelta(hours=hours))
+    return [((start + timedelta(minutes=15 * i)).strftime("%Y-%m-%d"),
+             (start + timedelta(minutes=15 * i)).strftime("%H:%M"))
+            for i in range(hours * 4 + 1)]
+
+
+def _raw_grade(conn, user_id, window_start):
+    values = [r[0] for r in conn.execute(
+        "SELECT glucose FROM libre_glucose WHERE user_id = ? AND ts >= ? ORDER BY ts",
+        (user_id, window_start))]
+    return score_glucose(values) if values else None
+
+
+def _state_grade(conn, user_id, window_start):
+    state = rolling_grade.read_state(conn, user_id, HOURS, window_start)
+    stats = rolling_grade.state_stats(state)
+    return score_from_stats(*stats) if stats else None
+
+
+def _conn():
+    models.init_db()
+    return models.get_conn()
+
+
+def test_state_matches_score_glucose_on_random_data():
+    conn = _conn()
+    rng = random.Random(5)
+    now = datetime.now()
+    for user_id in range(1, 41):
+        slots = _slots(now, HOURS + 12)
+        # Mostly in order with the odd late arrival; values cluster on band
+        # edges (70/150) and jump by more than SPIKE_DELTA now and then.
+        order = sorted(range(len(slots)), key=lambda i: i + rng.choice([0] * 9 + [rng.randint(-40, 0)]))
+        for i in order:
+            if rng.random() < 0.2:
+                continue
+            value = rng.choice([69, 70, 71, 149, 150, 151, rng.randint(40, 350)])
+            models.add_libre_glucose(user_id, *slots[i], value, conn=conn)
+
+        window_start = rolling_grade.window_start_ts(HOURS)
+        assert _state_grade(conn, user_id, window_start) == _raw_grade(conn, user_id, window_start)
+        # Later windows expire readings from the stored state
+        for later in (1, 5, 30):
+            ws = rolling_grade.window_start_ts(HOURS, now + timedelta(hours=later))
+            assert _state_grade(conn, user_id, ws) == _raw_grade(conn, user_id, ws)
+
+
+def test_read_state_does_not_write():
+    conn = _conn()
+    now = datetime.now()
+    for date, time in _slots(now, 3):
+        models.add_libre_glucose(100, date, time, 120, conn=conn)
+    # A row written behind the insert paths' back is folded in on read only
+    late = models.floor_to_15min(now + timedelta(minutes=30))
+    date, time = late.strftime("%Y-%m-%d"), late.strftime("%H:%M")
+    conn.execute("INSERT INTO libre_glucose (user_id, date, time, glucose, ts) VALUES (100, ?, ?, 99, ?)",
+                 (date, time, models.slot_ts(date, time)))
+    conn.commit()
+    before = conn.total_changes
+    state = rolling_grade.read_state(conn, 100, HOURS, rolling_grade.window_start_ts(HOURS, now + timedelta(hours=1)))
+    assert conn.total_changes == before
+    assert not conn.in_transaction
+    assert state["count"] > 0
+
+
+def test_null_ts_rows_are_skipped():
+    conn = _conn()
+    slots = _slots(datetime.now(), 2)
+    models.add_libre_glucose(200, *slots[0], 100, conn=conn)
+    conn.execute("INSERT INTO libre_glucose (user_id, date, time, glucose, ts) VALUES (200, ?, ?, 300, NULL)", slots[1])
+    models.add_libre_glucose(200, *slots[2], 110, conn=conn)
+    state = rolling_grade.read_state(conn, 200, HOURS)
+    assert state["count"] == 2 and state["spikes"] == 0
+
+
+def test_non_integer_window_falls_back_to_raw():
+    conn = _conn()
+    slots = _slots(datetime.now(), 2)
+    models.add_libre_glucose(300, *slots[0], 100, conn=conn)
+    models.add_libre_glucose(300, *slots[1], 100.5, conn=conn)
+    assert rolling_grade.state_stats(rolling_grade.read_state(conn, 300, HOURS)) is None
+    assert models.calculate_sugar_grade(300, HOURS) == _raw_grade(conn, 300, rolling_grade.window_start_ts(HOURS))
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
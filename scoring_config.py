@@ -0,0 +1,202 @@
+"""
+Compiled sugar scoring configuration.
+
+The grading matrix, the per-metric score bands and the metric weights are
+loaded once from grading_matrix / scoring_bands / scoring_weights and
+compiled into sorted edge arrays, so every lookup is a bisect (or one
+np.searchsorted for a whole array). load() re-reads the tables only when
+scoring_version changes; triggers bump it on any edit to those tables.
+
+A band row (metric, lower, lower_strict, score) means "score applies from
+lower upwards until the next band". lower is inclusive unless lower_strict,
+and a NULL lower is the score below every edge. Bands are contiguous by
+construction, so there are no gaps (e.g. CV between 20 and 21).
+"""
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+# Sugar Control Grading Matrix: (score_min, score_max, grade, interpretation, suggested_actions)
+GRADING_MATRIX = [
+    (85, 100, 10, "Excellent", "Maintain current habits, keep consistent."),
+    (75, 84, 9, "Very Good", "Minor adjustments; consider maintaining low-carb options."),
+    (65, 74, 8, "Good", "Small improvements, e.g., adding fiber and lean protein to meals."),
+    (55, 64, 7, "Fair", "Focus on stable meal timings, avoid high-GI foods."),
+    (45, 54, 6, "Satisfactory", "Begin making meal adjustments to reduce variability and spikes."),
+    (35, 44, 5, "Moderate", "Moderate improvements; reduce carbs at high-variance meals."),
+    (25, 34, 4, "Needs Improvement", "Reduce large spikes; add low-GI foods and consider exercise adjustments."),
+    (15, 24, 3, "Poor", "Re-evaluate meal composition; replace carbs with high-quality proteins."),
+    (5, 14, 2, "Very Poor", "Major changes needed; focus on protein, fiber, and activity level."),
+    (0, 4, 1, "Critical", "Significant intervention; low-carb focus, avoid all high-GI foods."),
+]
+
+# (metric, lower, lower_strict, score)
+SCORING_BANDS = [
+    # TIR %: >=90 -> 100 ... >=60 -> 70, then -10 per started 10 points below 60
+    ("tir", None, 0, 10),
+    ("tir", 0, 1, 20),
+    ("tir", 10, 1, 30),
+    ("tir", 20, 1, 40),
+    ("tir", 30, 1, 50),
+    ("tir", 40, 1, 60),
+    ("tir", 50, 1, 70),
+    ("tir", 70, 0, 80),
+    ("tir", 80, 0, 90),
+    ("tir", 90, 0, 100),
+    # CV %: 10-20 -> 100, up to 30 -> 80, 40 -> 60, 50 -> 40, otherwise 20
+    ("variability", None, 0, 20),
+    ("variability", 10, 0, 100),
+    ("variability", 20, 1, 80),
+    ("variability", 30, 1, 60),
+    ("variability", 40, 1, 40),
+    ("variability", 50, 1, 20),
+    # Rounded average glucose mg/dL
+    ("avg", None, 0, 30),
+    ("avg", 90, 0, 100),
+    ("avg", 110, 1, 90),
+    ("avg", 130, 1, 70),
+    ("avg", 150, 1, 50),
+    ("avg", 170, 1, 30),
+    # Spike count
+    ("spike", None, 0, 100),
+    ("spike", 1, 0, 80),
+    ("spike", 2, 0, 60),
+    ("spike", 3, 0, 40),
+    ("spike", 4, 0, 20),
+]
+
+# Weighted final score, summed in this order
+SCORING_WEIGHTS = [
+    ("tir", 0.35),
+    ("variability", 0.25),
+    ("avg", 0.25),
+    ("spike", 0.15),
+]
+
+
+class ScoringConfig:
+    """Grading matrix, bands and weights compiled for bisect/searchsorted lookups."""
+
+    def __init__(self, grading_matrix=GRADING_MATRIX, bands=SCORING_BANDS, weights=SCORING_WEIGHTS, version=0):
+        self.version = version
+        self.weights = [(metric, float(w)) for metric, w in weights]
+
+        # metric -> (edges, scores); scores[i] applies from edges[i-1], scores[0] below every edge
+        self._bands = {}
+        for metric in {b[0] for b in bands}:
+            rows = [b for b in bands if b[0] == metric]
+            base = [b[3] for b in rows if b[1] is None]
+            rows = sorted((b for b in rows if b[1] is not None), key=lambda b: (b[1], b[2]))
+            # x > lower  <=>  x >= nextafter(lower), so every edge becomes lower-inclusive
+            edges = [math.nextafter(float(lower), math.inf) if strict else float(lower)
+                     for _, lower, strict, _ in rows]
+            scores = [base[0] if base else 0] + [b[3] for b in rows]
+            self._bands[metric] = (edges, scores, np.array(edges), np.array(scores))
+
+        matrix = sorted(grading_matrix, key=lambda r: r[0])
+        self._grade_mins = [r[0] for r in matrix]
+        self._grade_maxs = [r[1] for r in matrix]
+        self._grade_rows = [(r[2], r[3], r[4]) for r in matrix]
+        self._np_grade_mins = np.array(self._grade_mins)
+        self._np_grade_maxs = np.array(self._grade_maxs)
+        self._np_grades = np.array([r[0] for r in self._grade_rows])
+
+    def score(self, metric: str, value) -> int:
+        edges, scores, _, _ = self._bands[metric]
+        return scores[bisect_right(edges, value)]
+
+    def score_array(self, metric: str, values) -> np.ndarray:
+        _, _, edges, scores = self._bands[metric]
+        return scores[np.searchsorted(edges, np.asarray(values, dtype=np.float64), side="right")]
+
+    def final_score(self, component_scores: dict) -> int:
+        total = 0
+        for metric, weight in self.weights:
+            total += component_scores[metric] * weight
+        return round(total)
+
+    def grade(self, final_score: int):
+        """Return (grade, interpretation, suggested_actions) for a final score."""
+        i = bisect_right(self._grade_mins, final_score) - 1
+        if i >= 0 and final_score <= self._grade_maxs[i]:
+            return self._grade_rows[i]
+        return None, "Unknown", "No suggestions"
+
+    def grades(self, final_scores) -> np.ndarray:
+        """Vectorized grade(): grade number per final score, 0 where no matrix row matches."""
+        final_scores = np.asarray(final_scores)
+        if not self._grade_mins:
+            return np.zeros(final_scores.shape, dtype=np.int64)
+        i = np.searchsorted(self._np_grade_mins, final_scores, side="right") - 1
+        safe = np.clip(i, 0, len(self._grade_mins) - 1)
+        ok = (i >= 0) & (final_scores <= self._np_grade_maxs[safe])
+        return np.where(ok, self._np_grades[safe], 0)
+
+
+DEFAULT_CONFIG = ScoringConfig()
+
+_loaded = None
+
+
+def seed_tables(conn):
+    """Create the scoring tables and version triggers, seeding defaults when empty."""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS scoring_bands (
+            metric TEXT NOT NULL,          -- tir | variability | avg | spike
+            lower REAL,                    -- NULL = below every edge
+            lower_strict INTEGER NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS scoring_weights (
+            metric TEXT PRIMARY KEY,
+            weight REAL NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS scoring_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO scoring_version (id, version) VALUES (1, 1)")
+    for table in ("grading_matrix", "scoring_bands", "scoring_weights"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE scoring_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+    c.execute("SELECT COUNT(*) FROM scoring_bands")
+    if c.fetchone()[0] == 0:
+        c.executemany("""
+            INSERT INTO scoring_bands (metric, lower, lower_strict, score) VALUES (?, ?, ?, ?)
+        """, SCORING_BANDS)
+    c.execute("SELECT COUNT(*) FROM scoring_weights")
+    if c.fetchone()[0] == 0:
+        c.executemany("INSERT INTO scoring_weights (metric, weight) VALUES (?, ?)", SCORING_WEIGHTS)
+    conn.commit()
+
+
+def load(conn) -> ScoringConfig:
+    """Return the compiled config, recompiling only when scoring_version has moved."""
+    global _loaded
+    version = conn.execute("SELECT version FROM scoring_version WHERE id = 1").fetchone()[0]
+    if _loaded is not None and _loaded.version == version:
+        return _loaded
+
+    matrix = [tuple(r) for r in conn.execute("""
+        SELECT score_min, score_max, grade, interpretation, suggested_actions FROM grading_matrix
+    """)]
+    bands = [tuple(r) for r in conn.execute("SELECT metric, lower, lower_strict, score FROM scoring_bands")]
+    weights = {r[0]: r[1] for r in conn.execute("SELECT metric, weight FROM scoring_weights")}
+    # keep the summation order of SCORING_WEIGHTS so final scores round the same way
+    ordered = [(m, weights.pop(m)) for m, _ in SCORING_WEIGHTS if m in weights] + sorted(weights.items())
+    _loaded = ScoringConfig(matrix, bands, ordered, version)
+    return _loaded
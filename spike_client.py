@@ -1,12 +1,57 @@
-import os
 import hmac
+import time
+import random
+import asyncio
 import hashlib
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Iterable, List, Tuple, Callable
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
 SPIKE_BASE_URL = "https://app-api.spikeapi.com/v3"
 
-class SpikeClient:
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_delay(backoff: float, attempt: int, retry_after: Optional[str], max_delay: float) -> Optional[float]:
+    """
+    Seconds to sleep before the next attempt, never more than max_delay.
+    Without Retry-After: jittered exponential backoff. With it: the server's
+    seconds plus up to 25% upward jitter, so we never come back early; None
+    (stop retrying) when the server asks for a longer wait than max_delay.
+    """
+    if retry_after and retry_after.isdigit():
+        wait = float(retry_after)
+        if wait > max_delay:
+            return None
+        return min(wait * random.uniform(1.0, 1.25), max_delay)
+    return min(backoff * (2 ** attempt) * random.uniform(0.5, 1.5), max_delay)
+
+
+def _timeseries_params(metric: str, start, end, interval: str, provider_slug: Optional[str]) -> Dict[str, Any]:
+    params = {
+        "metric": metric,
+        "from_timestamp": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "to_timestamp": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "interval": interval,
+    }
+    if provider_slug:
+        params = {"provider_slug": provider_slug, **params}
+    return params
+
+
+def _parse_token(data: Dict[str, Any]) -> Tuple[str, Optional[int]]:
+    token = data.get("access_token")
+    if not token:
+        raise RuntimeError("No access_token returned from Spike.")
+    expires_in = data.get("expires_in")
+    return token, int(expires_in) if expires_in else None
+
+
+class _SpikeAuth:
+    """HMAC signing shared by the sync and async clients."""
+
     def __init__(self, application_id: str, hmac_key: str, base_url: str = SPIKE_BASE_URL):
         self.application_id = str(application_id)
         self.hmac_key = hmac_key.encode()
@@ -17,43 +62,295 @@ class SpikeClient:
         h = hmac.new(self.hmac_key, user_id.encode(), hashlib.sha256)
         return h.hexdigest()
 
-    def get_access_token(self, application_user_id: str) -> str:
-        """Exchange signature for an access token using Spike HMAC auth."""
-        signature = self.sign_user(application_user_id)
-        url = f"{self.base_url}/auth/hmac"
-        payload = {
+    def _auth_payload(self, application_user_id: str) -> Dict[str, Any]:
+        return {
             "application_id": int(self.application_id) if self.application_id.isdigit() else self.application_id,
             "application_user_id": application_user_id,
-            "signature": signature,
+            "signature": self.sign_user(application_user_id),
         }
-        resp = requests.post(url, json=payload, headers={"Accept": "application/json"})
+
+
+class SpikeClient(_SpikeAuth):
+    def __init__(self, application_id: str, hmac_key: str, base_url: str = SPIKE_BASE_URL,
+                 pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 3, backoff: float = 0.5, max_retry_delay: float = 10.0):
+        super().__init__(application_id, hmac_key, base_url)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_delay = max_retry_delay
+
+        # One pooled keep-alive session for every Spike call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = "application/json"
+
+        self._metrics_lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        # Called as fn(endpoint, elapsed_ms, failed, retries) after every request, e.g. metrics.observe_spike_call
+        self.observers: List[Callable[[str, float, bool, int], None]] = []
+
+    @classmethod
+    def from_config(cls, config) -> "SpikeClient":
+        """Build a client from the app Config (base URL, credentials, pool size, deadlines, retries)."""
+        return cls(
+            config.SPIKE_APP_ID,
+            config.SPIKE_HMAC_KEY,
+            base_url=config.SPIKE_BASE_URL,
+            pool_size=config.SPIKE_POOL_SIZE,
+            connect_timeout=config.SPIKE_CONNECT_TIMEOUT,
+            read_timeout=config.SPIKE_READ_TIMEOUT,
+            max_retries=config.SPIKE_MAX_RETRIES,
+            backoff=config.SPIKE_BACKOFF,
+            max_retry_delay=config.SPIKE_MAX_RETRY_DELAY,
+        )
+
+    def _record(self, endpoint: str, elapsed_ms: float, failed: bool, retries: int):
+        with self._metrics_lock:
+            m = self._metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0,
+                                                    "total_ms": 0.0, "max_ms": 0.0})
+            m["calls"] += 1
+            m["errors"] += failed
+            m["retries"] += retries
+            m["total_ms"] += elapsed_ms
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+        for observe in self.observers:
+            observe(endpoint, elapsed_ms, failed, retries)
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint call count, errors, retries and avg/max latency in ms."""
+        with self._metrics_lock:
+            stats = {k: dict(v) for k, v in self._metrics.items()}
+        for m in stats.values():
+            m["avg_ms"] = round(m["total_ms"] / m["calls"], 2) if m["calls"] else 0.0
+        return stats
+
+    def _sleep_before_retry(self, attempt: int, resp: Optional[requests.Response]) -> bool:
+        """Sleep before the next attempt; False if the server asked for too long a wait."""
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        delay = _retry_delay(self.backoff, attempt, retry_after, self.max_retry_delay)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    def request(self, method: str, path: str, access_token: Optional[str] = None,
+                endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the pooled session with connect/read deadlines,
+        retrying 429/5xx responses and connection errors with jittered
+        exponential backoff (honouring Retry-After up to max_retry_delay).
+        Returns the final response (ok or not); raises
+        RuntimeError if every attempt failed to get a response.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        endpoint = endpoint or f"{method} /{path.lstrip('/')}"
+        headers = kwargs.pop("headers", {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        kwargs.setdefault("timeout", self.timeout)
+
+        started = time.perf_counter()
+        resp, error = None, None
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp, error = self.session.request(method, url, headers=headers, **kwargs), None
+                if resp.status_code not in RETRY_STATUSES:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                resp, error = None, e
+            if attempt < self.max_retries and not self._sleep_before_retry(attempt, resp):
+                break
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record(endpoint, elapsed_ms, resp is None or not resp.ok, attempt)
+        if resp is None:
+            raise RuntimeError(f"Spike {endpoint} failed after {attempt + 1} attempts: {error}")
+        return resp
+
+    def issue_token(self, application_user_id: str) -> Tuple[str, Optional[int]]:
+        """Exchange signature for (access_token, expires_in seconds or None) using Spike HMAC auth."""
+        resp = self.request("POST", "/auth/hmac", json=self._auth_payload(application_user_id))
         if not resp.ok:
             raise RuntimeError(f"Spike auth failed ({resp.status_code}): {resp.text}")
-        data = resp.json()
-        token = data.get("access_token")
-        if not token:
-            raise RuntimeError("No access_token returned from Spike.")
-        return token
+        return _parse_token(resp.json())
+
+    def get_access_token(self, application_user_id: str) -> str:
+        """Exchange signature for an access token using Spike HMAC auth."""
+        return self.issue_token(application_user_id)[0]
 
     def get_userinfo(self, access_token: str) -> Dict[str, Any]:
         """Call /userinfo with the provided token."""
-        url = f"{self.base_url}/userinfo"
-        resp = requests.get(url, headers={
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/json"
-        })
+        resp = self.request("GET", "/userinfo", access_token)
         if not resp.ok:
             raise RuntimeError(f"Spike /userinfo failed ({resp.status_code}): {resp.text}")
         return resp.json()
 
-    def api_get(self, path: str, access_token: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def api_get(self, path: str, access_token: str, params: Optional[Dict[str, Any]] = None,
+                endpoint: Optional[str] = None) -> Dict[str, Any]:
         """Generic GET helper for other Spike endpoints, e.g. /timeseries, /interval-stats, etc."""
         path = path.lstrip("/")
-        url = f"{self.base_url}/{path}"
-        resp = requests.get(url, params=params, headers={
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/json"
-        })
+        resp = self.request("GET", path, access_token, endpoint=endpoint, params=params)
         if not resp.ok:
             raise RuntimeError(f"Spike GET {path} failed ({resp.status_code}): {resp.text}")
         return resp.json()
+
+    def get_init_url(self, provider_slug: str, access_token: str) -> Dict[str, Any]:
+        """Start a provider integration (fitbit, freestyle_libre, ...); returns {"path": redirect_url}."""
+        return self.api_get(f"providers/{provider_slug}/integration/init_url", access_token,
+                            endpoint="GET /providers/{provider}/integration/init_url")
+
+    def get_timeseries(self, access_token: str, metric: str, start, end,
+                       interval: str = "5minute", provider_slug: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch /queries/timeseries for a metric between two UTC datetimes."""
+        params = _timeseries_params(metric, start, end, interval, provider_slug)
+        return self.api_get("queries/timeseries", access_token, params=params)
+
+
+class AsyncSpikeClient(_SpikeAuth):
+    """
+    asyncio counterpart of SpikeClient for sync jobs. fetch_timeseries_many()
+    runs many (user, metric, window) queries concurrently over one pooled
+    httpx.AsyncClient, capped by a semaphore, with the same retry policy.
+
+        async with AsyncSpikeClient.from_config(Config) as client:
+            results = await client.fetch_timeseries_many(jobs)
+    """
+
+    def __init__(self, application_id: str, hmac_key: str, base_url: str = SPIKE_BASE_URL,
+                 max_in_flight: int = 20, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 3, backoff: float = 0.5, max_retry_delay: float = 10.0):
+        super().__init__(application_id, hmac_key, base_url)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_delay = max_retry_delay
+        # application_user_id -> (access_token, expires_in) for every token this client issued
+        self.issued_tokens: Dict[str, Tuple[str, Optional[int]]] = {}
+        # fn(endpoint, elapsed_ms, failed, retries) after every request, like SpikeClient.observers
+        self.observers: List[Callable[[str, float, bool, int], None]] = []
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url + "/",
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+
+    @classmethod
+    def from_config(cls, config) -> "AsyncSpikeClient":
+        return cls(
+            config.SPIKE_APP_ID,
+            config.SPIKE_HMAC_KEY,
+            base_url=config.SPIKE_BASE_URL,
+            max_in_flight=config.SPIKE_MAX_IN_FLIGHT,
+            connect_timeout=config.SPIKE_CONNECT_TIMEOUT,
+            read_timeout=config.SPIKE_READ_TIMEOUT,
+            max_retries=config.SPIKE_MAX_RETRIES,
+            backoff=config.SPIKE_BACKOFF,
+            max_retry_delay=config.SPIKE_MAX_RETRY_DELAY,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def request(self, method: str, path: str, access_token: Optional[str] = None,
+                      endpoint: Optional[str] = None, **kwargs) -> httpx.Response:
+        """Async SpikeClient.request: retries 429/5xx and transport errors with jittered backoff."""
+        endpoint = endpoint or f"{method} /{path.lstrip('/')}"
+        headers = kwargs.pop("headers", {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        started = time.perf_counter()
+        resp, error = None, None
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp, error = await self.client.request(method, path.lstrip("/"), headers=headers, **kwargs), None
+                if resp.status_code not in RETRY_STATUSES:
+                    break
+            except httpx.TransportError as e:
+                resp, error = None, e
+            if attempt < self.max_retries:
+                retry_after = resp.headers.get("Retry-After") if resp is not None else None
+                delay = _retry_delay(self.backoff, attempt, retry_after, self.max_retry_delay)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for observe in self.observers:
+            observe(endpoint, elapsed_ms, resp is None or resp.status_code >= 400, attempt)
+        if resp is None:
+            raise RuntimeError(f"Spike {endpoint} failed after {attempt + 1} attempts: {error}")
+        return resp
+
+    async def issue_token(self, application_user_id: str) -> Tuple[str, Optional[int]]:
+        """
+        Exchange signature for (access_token, expires_in seconds or None) using
+        Spike HMAC auth. Also kept in issued_tokens for the caller's cache.
+        """
+        resp = await self.request("POST", "/auth/hmac", json=self._auth_payload(application_user_id))
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Spike auth failed ({resp.status_code}): {resp.text}")
+        self.issued_tokens[application_user_id] = issued = _parse_token(resp.json())
+        return issued
+
+    async def get_access_token(self, application_user_id: str) -> str:
+        """Exchange signature for an access token using Spike HMAC auth."""
+        return (await self.issue_token(application_user_id))[0]
+
+    async def get_timeseries(self, access_token: str, metric: str, start, end,
+                             interval: str = "5minute", provider_slug: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch /queries/timeseries for a metric between two UTC datetimes."""
+        params = _timeseries_params(metric, start, end, interval, provider_slug)
+        resp = await self.request("GET", "/queries/timeseries", access_token, params=params)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Spike GET queries/timeseries failed ({resp.status_code}): {resp.text}")
+        return resp.json()
+
+    async def fetch_timeseries_many(self, jobs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fetch many timeseries concurrently. Each job is a dict with user_id,
+        metric, start, end and optionally access_token, interval and
+        provider_slug. Jobs without a token get one per user via HMAC auth
+        (one exchange per user, shared by that user's jobs); those tokens end
+        up in issued_tokens.
+
+        Returns one dict per job, in order: the job's user_id/metric plus
+        "payload" (decoded JSON, ready for models.add_*_bulk) or "error".
+        """
+        jobs = list(jobs)
+        sem = asyncio.Semaphore(self.max_in_flight)
+        tokens: Dict[str, asyncio.Task] = {}
+
+        async def token_for(user_id) -> str:
+            key = str(user_id)
+            if key not in tokens:
+                async def fetch():
+                    async with sem:
+                        return await self.get_access_token(key)
+                tokens[key] = asyncio.ensure_future(fetch())
+            return await tokens[key]
+
+        async def run(job):
+            result = {"user_id": job["user_id"], "metric": job["metric"]}
+            try:
+                token = job.get("access_token") or await token_for(job["user_id"])
+                async with sem:
+                    result["payload"] = await self.get_timeseries(
+                        token, job["metric"], job["start"], job["end"],
+                        interval=job.get("interval", "5minute"),
+                        provider_slug=job.get("provider_slug"),
+                    )
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+
+        return await asyncio.gather(*(run(job) for job in jobs))
@@ -0,0 +1,151 @@
+"""
+SpikeClient / AsyncSpikeClient retry and pooling checks against a local
+stand-in HTTP server (no network, no Spike credentials).
+
+Each test scripts the responses for one path: an HTTP status (optionally
+with Retry-After) or "reset" to drop the connection with a TCP RST.
+
+    python -m pytest -q spike_client_test.py
+    python spike_client_test.py
+"""
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from spike_client import AsyncSpikeClient, SpikeClient, _retry_delay
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.scripts = {}       # path -> list of (status, headers) or "reset", consumed in order
+        self.hits = []          # (path, client port, monotonic time) per request
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v3"
+
+    def script(self, path, *steps):
+        self.scripts[path] = list(steps)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, so pool reuse is visible
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        path = self.path.split("?")[0]
+        with self.server.lock:
+            self.server.hits.append((path, self.client_address[1], time.monotonic()))
+            steps = self.server.scripts.get(path, [])
+            step = steps.pop(0) if len(steps) > 1 else (steps[0] if steps else (200, {}))
+        if step == "reset":
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            return
+        status, headers = step
+        body = json.dumps({"ok": status < 400, "access_token": "tok", "expires_in": 60}).encode()
+        self.send_response(status)
+        for k, v in {"Content-Type": "application/json", "Content-Length": str(len(body)), **headers}.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._respond()
+
+
+def _sync_client(server, **kw):
+    return SpikeClient("1", "key", base_url=server.base_url, backoff=0.01, max_retry_delay=2, **kw)
+
+
+def _async_client(server, **kw):
+    return AsyncSpikeClient("1", "key", base_url=server.base_url, backoff=0.01, max_retry_delay=2, **kw)
+
+
+def _gaps(server, path):
+    times = [t for p, _, t in server.hits if p == path]
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+def test_retry_delay_bounds():
+    for attempt in range(10):
+        assert 0 < _retry_delay(0.5, attempt, None, 5) <= 5
+        assert 3 <= _retry_delay(0.5, attempt, "3", 5) <= 3.75
+    assert _retry_delay(0.5, 0, "3600", 5) is None
+
+
+def test_sync_429_retry_after_waits_at_least_the_header():
+    server = StandIn()
+    server.script("/v3/userinfo", (429, {"Retry-After": "1"}), (200, {}))
+    resp = _sync_client(server).request("GET", "/userinfo")
+    assert resp.status_code == 200
+    assert 1.0 <= _gaps(server, "/v3/userinfo")[0] < 2.0
+
+
+def test_sync_503_retry_after_over_the_cap_returns_without_sleeping():
+    server = StandIn()
+    server.script("/v3/userinfo", (503, {"Retry-After": "3600"}), (200, {}))
+    started = time.monotonic()
+    resp = _sync_client(server).request("GET", "/userinfo")
+    assert resp.status_code == 503
+    assert time.monotonic() - started < 1.0
+    assert len(server.hits) == 1
+
+
+def test_sync_connection_reset_is_retried():
+    server = StandIn()
+    server.script("/v3/userinfo", "reset", "reset", (200, {}))
+    client = _sync_client(server)
+    assert client.request("GET", "/userinfo").status_code == 200
+    assert client.latency_stats()["GET /userinfo"]["retries"] == 2
+
+
+def test_sync_pool_reuses_one_connection():
+    server = StandIn()
+    client = _sync_client(server)
+    for _ in range(5):
+        assert client.request("GET", "/userinfo").ok
+    assert len({port for _, port, _ in server.hits}) == 1
+
+
+def test_async_retry_after_reset_and_pool_reuse():
+    server = StandIn()
+    server.script("/v3/auth/hmac", (429, {"Retry-After": "1"}), (200, {}))
+    server.script("/v3/queries/timeseries", "reset", (503, {"Retry-After": "1"}), (200, {}))
+
+    async def go():
+        async with _async_client(server, max_in_flight=1) as client:
+            token, _ = await client.issue_token("7")
+            first = await client.request("GET", "/queries/timeseries", token)
+            again = [await client.request("GET", "/userinfo", token) for _ in range(3)]
+            return token, first, again
+
+    token, first, again = asyncio.run(go())
+    assert token == "tok" and first.status_code == 200
+    assert all(r.status_code == 200 for r in again)
+    assert 1.0 <= _gaps(server, "/v3/auth/hmac")[0] < 2.0
+    assert 1.0 <= _gaps(server, "/v3/queries/timeseries")[1] < 2.0
+    # The reset connection is replaced once; the /userinfo calls share the survivor
+    assert len({port for p, port, _ in server.hits if p == "/v3/userinfo"}) == 1
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,135 @@
+"""
+Spike access token cache.
+
+Tokens live in spike_tokens keyed by our user_id, so every gunicorn worker
+(and sync_worker.py) shares them. get_token() hands out the cached token
+while it has more than SPIKE_TOKEN_REFRESH_MARGIN seconds left and only
+goes to Spike's HMAC auth on first use after it expires.
+
+Refreshes are coalesced by a short lease (lease_until): the refresher takes
+it and the others, in this process or another, poll the table for the new
+token for at most SPIKE_TOKEN_WAIT seconds. A per-user lock only guards the check-and-take, never the call to
+Spike, so a slow auth round trip does not block users sharing its stripe.
+"""
+import threading
+import time
+
+from config import Config
+
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _lock_for(user_id: int) -> threading.Lock:
+    return _locks[int(user_id) % len(_locks)]
+
+
+def peek(conn, user_id: int):
+    """Cached token that is still good for the refresh margin, else None. Never calls Spike."""
+    row = conn.execute("""
+        SELECT access_token FROM spike_tokens
+        WHERE user_id = ? AND access_token IS NOT NULL AND expires_at > ?
+    """, (user_id, time.time() + Config.SPIKE_TOKEN_REFRESH_MARGIN)).fetchone()
+    return row[0] if row else None
+
+
+def peek_many(conn, user_ids):
+    """{user_id: token} for the users in user_ids that have a usable cached token."""
+    if not user_ids:
+        return {}
+    rows = conn.execute(f"""
+        SELECT user_id, access_token FROM spike_tokens
+        WHERE user_id IN ({", ".join("?" for _ in user_ids)})
+          AND access_token IS NOT NULL AND expires_at > ?
+    """, [*user_ids, time.time() + Config.SPIKE_TOKEN_REFRESH_MARGIN]).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+
+def store(conn, user_id: int, token: str, expires_in=None):
+    """Save a freshly issued token and release any refresh lease."""
+    expires_at = time.time() + (expires_in or Config.SPIKE_TOKEN_TTL)
+    with conn:
+        conn.execute("""
+            INSERT INTO spike_tokens (user_id, access_token, expires_at, lease_until)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(user_id) DO UPDATE SET
+                access_token = excluded.access_token,
+                expires_at = excluded.expires_at,
+                lease_until = 0
+        """, (user_id, token, expires_at))
+
+
+def store_many(conn, issued: dict):
+    """store() for {user_id: (token, expires_in)}, in one transaction."""
+    if not issued:
+        return
+    now = time.time()
+    with conn:
+        conn.executemany("""
+            INSERT INTO spike_tokens (user_id, access_token, expires_at, lease_until)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(user_id) DO UPDATE SET
+                access_token = excluded.access_token,
+                expires_at = excluded.expires_at,
+                lease_until = 0
+        """, [(uid, token, now + (expires_in or Config.SPIKE_TOKEN_TTL))
+              for uid, (token, expires_in) in issued.items()])
+
+
+def invalidate(conn, user_id: int):
+    """Force the next get_token() to refresh, e.g. after Spike rejected the token."""
+    with conn:
+        conn.execute("UPDATE spike_tokens SET expires_at = 0 WHERE user_id = ?", (user_id,))
+
+
+def _take_lease(conn, user_id: int) -> bool:
+    now = time.time()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO spike_tokens (user_id) VALUES (?)", (user_id,))
+        cur = conn.execute("""
+            UPDATE spike_tokens SET lease_until = ?
+            WHERE user_id = ? AND lease_until <= ?
+        """, (now + Config.SPIKE_TOKEN_LEASE, user_id, now))
+    return cur.rowcount == 1
+
+
+def _release_lease(conn, user_id: int):
+    with conn:
+        conn.execute("UPDATE spike_tokens SET lease_until = 0 WHERE user_id = ?", (user_id,))
+
+
+def get_token(client, user_id: int, conn=None) -> str:
+    """
+    Return a valid Spike access token for user_id, refreshing it through
+    client.issue_token() only when the cached one is missing or expiring.
+    Raises RuntimeError if Spike auth fails or another refresh is still
+    running after SPIKE_TOKEN_WAIT seconds.
+    """
+    from models import get_conn
+
+    if conn is None:
+        conn = get_conn()
+    token = peek(conn, user_id)
+    if token:
+        return token
+
+    # Someone else is refreshing: wait for their token (the lease expires if they die)
+    deadline = time.monotonic() + Config.SPIKE_TOKEN_WAIT
+    while True:
+        with _lock_for(user_id):
+            token = peek(conn, user_id)
+            if token:
+                return token
+            if _take_lease(conn, user_id):
+                break
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Timed out waiting for another Spike token refresh for user {user_id}")
+        time.sleep(0.05)
+
+    # Lease held: the Spike round trip happens outside the lock
+    try:
+        token, expires_in = client.issue_token(str(user_id))
+    except Exception:
+        _release_lease(conn, user_id)
+        raise
+    store(conn, user_id, token, expires_in)
+    return token
@@ -0,0 +1,106 @@
+import math
+import sys
+
+import numpy as np
+
+from scoring_config import DEFAULT_CONFIG
+
+
+TIR_LOW = 70
+TIR_HIGH = 150
+SPIKE_DELTA = 30
+
+
+def _sqrt_of_frac(n: int, m: int) -> float:
+    """Correctly rounded sqrt(n / m), the same rounding statistics.stdev uses."""
+    q = (n.bit_length() - m.bit_length() - (2 * sys.float_info.mant_dig + 3)) // 2
+    if q >= 0:
+        m <<= 2 * q
+    else:
+        n <<= -2 * q
+    a = math.isqrt(n // m)
+    a |= (a * a * m != n)  # round-to-odd keeps the final float rounding exact
+    return float(a << q) if q >= 0 else a / (1 << -q)
+
+
+def glucose_stats(values: np.ndarray):
+    """
+    Mean and sample standard deviation of glucose values.
+    Integer-valued readings (the CGM norm) are summed exactly, so the
+    results are bit-identical to statistics.mean / statistics.stdev.
+    """
+    n = len(values)
+    mean = float(np.mean(values))
+    if n < 2:
+        return mean, 0
+    if np.array_equal(values, np.round(values)):
+        ints = values.astype(np.int64)
+        s1 = int(ints.sum())
+        s2 = int((ints * ints).sum())
+        return mean, _sqrt_of_frac(n * s2 - s1 * s1, n * (n - 1))
+    return mean, float(np.std(values, ddof=1))
+
+
+def score_glucose(values, timestamps=None, config=DEFAULT_CONFIG):
+    """
+    Grade a window of glucose readings without touching the database.
+
+    values: array-like of glucose readings (list, NumPy array, pandas Series).
+    timestamps: optional array-like of the same length; readings are put in
+        timestamp order first, otherwise they are taken as already ordered.
+    config: scoring_config.ScoringConfig with the bands, weights and matrix.
+
+    Returns the sugar grade result dict, or None if there are no readings.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if timestamps is not None:
+        values = values[np.argsort(np.asarray(timestamps), kind="stable")]
+    n = len(values)
+    if n == 0:
+        return None
+
+    in_range_count = int(np.count_nonzero((values >= TIR_LOW) & (values <= TIR_HIGH)))
+    mean_glucose, std_dev = glucose_stats(values)
+    spike_count = int(np.count_nonzero(np.diff(values) > SPIKE_DELTA))
+    return score_from_stats(n, mean_glucose, std_dev, in_range_count, spike_count, config)
+
+
+def score_from_stats(count: int, mean_glucose: float, std_dev: float, in_range_count: int,
+                     spike_count: int, config=DEFAULT_CONFIG):
+    """
+    Build the sugar grade result dict from window aggregates
+    (reading count, mean, sample std dev, in-range count, spike count).
+    """
+    tir_percent = (in_range_count / count) * 100
+    tir_score = config.score("tir", tir_percent)
+
+    cv = (std_dev / mean_glucose) * 100 if mean_glucose else 0
+    variability_score = config.score("variability", cv)
+
+    avg_glucose = round(mean_glucose)
+    avg_score = config.score("avg", avg_glucose)
+
+    spike_score = config.score("spike", spike_count)
+
+    final_score = config.final_score({
+        "tir": tir_score,
+        "variability": variability_score,
+        "avg": avg_score,
+        "spike": spike_score,
+    })
+    grade, interpretation, actions = config.grade(final_score)
+
+    return {
+        "tir_percent": round(tir_percent, 2),
+        "tir_score": tir_score,
+        "variability": round(cv, 2),
+        "variability_score": variability_score,
+        "avg_glucose": avg_glucose,
+        "avg_score": avg_score,
+        "spike_count": spike_count,
+        "spike_score": spike_score,
+        "final_score": final_score,
+        "grade": grade,
+        "interpretation": interpretation,
+        "suggested_actions": actions
+    }
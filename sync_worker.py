@@ -0,0 +1,244 @@
+"""
+Background Spike sync.
+
+Instead of calling Spike inside page handlers, a scheduler thread (or this
+module run as its own process) pulls new Fitbit steps and Libre glucose for
+users in the background. sync_cursors keeps the last ingested reading per
+(user_id, provider, metric), so each cycle only fetches the delta since
+then and bulk-inserts it.
+
+Each cycle takes at most SYNC_MAX_USERS_PER_CYCLE users that are due
+(least recently synced first) and works through them SYNC_BATCH_SIZE at a
+time, with AsyncSpikeClient capping requests in flight. A batch that is
+mostly failing (e.g. Spike rate-limiting us) ends the cycle early.
+
+Every gunicorn worker that starts the thread, plus cron runs of --once,
+competes for one row in sync_lease: only the process holding it (owner plus
+an expiry of SYNC_LEASE_SECONDS, renewed before each batch) runs a cycle,
+and the others skip theirs. A crashed owner's lease simply expires.
+
+    python sync_worker.py            # run forever
+    python sync_worker.py --once     # one cycle, e.g. from cron
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import spike_tokens
+from config import Config
+from spike_client import AsyncSpikeClient
+
+# (provider, metric, provider_slug, first-sync lookback, bulk ingest function name)
+SYNC_TARGETS = [
+    ("fitbit", "steps", None, timedelta(days=7), "add_fitbit_steps_bulk"),
+    ("libre", "glucose", "libre", timedelta(days=1), "add_libre_glucose_bulk"),
+]
+LEASE_NAME = "spike-sync"
+
+
+def lease_owner() -> str:
+    """This process and thread, as recorded in sync_lease.owner."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def take_lease(conn, owner: str) -> bool:
+    """Take or renew the sync lease for SYNC_LEASE_SECONDS; False while another owner holds it."""
+    now = time.time()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO sync_lease (name) VALUES (?)", (LEASE_NAME,))
+        cur = conn.execute("""
+            UPDATE sync_lease SET owner = ?, expires_at = ?
+            WHERE name = ? AND (owner = ? OR expires_at <= ?)
+        """, (owner, now + Config.SYNC_LEASE_SECONDS, LEASE_NAME, owner, now))
+    return cur.rowcount == 1
+
+
+def release_lease(conn, owner: str):
+    with conn:
+        conn.execute("UPDATE sync_lease SET expires_at = 0 WHERE name = ? AND owner = ?", (LEASE_NAME, owner))
+
+
+def due_users(conn, limit: int, interval_seconds: int):
+    """Users not synced within the interval, least recently synced first."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=interval_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+    rows = conn.execute("""
+        SELECT u.user_id
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, MIN(last_synced_at) AS synced
+            FROM sync_cursors GROUP BY user_id
+        ) s ON s.user_id = u.user_id
+        WHERE s.synced IS NULL OR s.synced <= ?
+        ORDER BY s.synced IS NOT NULL, s.synced
+        LIMIT ?
+    """, (cutoff, limit)).fetchall()
+    return [r[0] for r in rows]
+
+
+def load_cursors(conn, user_ids):
+    if not user_ids:
+        return {}
+    rows = conn.execute(f"""
+        SELECT user_id, provider, metric, last_ts FROM sync_cursors
+        WHERE user_id IN ({", ".join("?" for _ in user_ids)})
+    """, list(user_ids)).fetchall()
+    return {(r[0], r[1], r[2]): r[3] for r in rows}
+
+
+def save_cursor(conn, user_id: int, provider: str, metric: str, last_ts, error=None):
+    conn.execute("""
+        INSERT INTO sync_cursors (user_id, provider, metric, last_ts, last_synced_at, last_error)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, provider, metric) DO UPDATE SET
+            last_ts = COALESCE(excluded.last_ts, sync_cursors.last_ts),
+            last_synced_at = excluded.last_synced_at,
+            last_error = excluded.last_error
+    """, (user_id, provider, metric, last_ts,
+          datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), error))
+
+
+def build_jobs(user_ids, cursors, now: datetime, tokens=None):
+    """One fetch job per user and target; users with a cached Spike token reuse it."""
+    tokens = tokens or {}
+    jobs = []
+    for uid in user_ids:
+        for provider, metric, slug, lookback, _ in SYNC_TARGETS:
+            last_ts = cursors.get((uid, provider, metric))
+            start = datetime.fromtimestamp(last_ts, timezone.utc) if last_ts else now - lookback
+            jobs.append({"user_id": uid, "provider": provider, "metric": metric,
+                         "provider_slug": slug, "start": start, "end": now,
+                         "access_token": tokens.get(uid)})
+    return jobs
+
+
+def ingest_results(conn, jobs, results):
+    """Bulk-insert each fetched payload and move its cursor. Returns (inserted, errors)."""
+    import models
+
+    ingest = {(p, m): getattr(models, fn) for p, m, _, _, fn in SYNC_TARGETS}
+    inserted = errors = 0
+    for job, result in zip(jobs, results):
+        uid, provider, metric = job["user_id"], job["provider"], job["metric"]
+        if "error" in result:
+            errors += 1
+            with conn:
+                save_cursor(conn, uid, provider, metric, None, result["error"][:500])
+            continue
+        readings = list(models.iter_spike_readings(result["payload"]))
+        n, _ = ingest[(provider, metric)](uid, readings, conn=conn)
+        inserted += n
+        last_ts = max((models.slot_ts(d, t) for d, t, _ in readings), default=None)
+        with conn:
+            save_cursor(conn, uid, provider, metric, last_ts)
+    return inserted, errors
+
+
+async def _fetch(jobs):
+    """(results, {user_id: (token, expires_in)} for tokens issued on the way)."""
+    async with AsyncSpikeClient.from_config(Config) as client:
+        if Config.METRICS_ENABLED:
+            import metrics
+            client.observers.append(metrics.observe_spike_call)
+        results = await client.fetch_timeseries_many(jobs)
+        return results, {int(uid): issued for uid, issued in client.issued_tokens.items()}
+
+
+def run_cycle(conn=None):
+    """
+    One sync pass over the users that are due. Returns a summary dict, with
+    skipped=True when another process holds the sync lease.
+    """
+    from models import get_conn
+
+    if conn is None:
+        conn = get_conn()
+    owner = lease_owner()
+    if not take_lease(conn, owner):
+        return {"skipped": True}
+    try:
+        return _run_cycle(conn, owner)
+    finally:
+        release_lease(conn, owner)
+
+
+def _run_cycle(conn, owner: str):
+    started = time.perf_counter()
+    user_ids = due_users(conn, Config.SYNC_MAX_USERS_PER_CYCLE, Config.SYNC_INTERVAL_SECONDS)
+    summary = {"users": 0, "inserted": 0, "errors": 0, "stopped_early": False}
+
+    for i in range(0, len(user_ids), Config.SYNC_BATCH_SIZE):
+        if i and not take_lease(conn, owner):
+            # Lease expired mid-cycle and another process took over
+            summary["stopped_early"] = True
+            break
+        batch = user_ids[i:i + Config.SYNC_BATCH_SIZE]
+        jobs = build_jobs(batch, load_cursors(conn, batch), datetime.now(timezone.utc),
+                          spike_tokens.peek_many(conn, batch))
+        results, issued = asyncio.run(_fetch(jobs))
+        spike_tokens.store_many(conn, issued)     # next cycle (and the web app) reuse them
+        inserted, errors = ingest_results(conn, jobs, results)
+        summary["users"] += len(batch)
+        summary["inserted"] += inserted
+        summary["errors"] += errors
+        if jobs and errors / len(jobs) > 0.5:
+            # Back off: most of this batch failed, leave the rest for the next cycle
+            summary["stopped_early"] = True
+            break
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+class SyncWorker(threading.Thread):
+    """Daemon thread that runs run_cycle() every SYNC_INTERVAL_SECONDS."""
+
+    def __init__(self, interval: int = None):
+        super().__init__(name="spike-sync", daemon=True)
+        self.interval = interval or Config.SYNC_INTERVAL_SECONDS
+        self._stop_event = threading.Event()
+
+    def run(self):
+        from models import close_conn
+
+        while not self._stop_event.is_set():
+            try:
+                summary = run_cycle()
+                if not summary.get("skipped"):
+                    print(f"Spike sync: {summary}")
+            except Exception as e:
+                print("Spike sync error:", e)
+            finally:
+                close_conn()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_background_sync() -> SyncWorker:
+    worker = SyncWorker()
+    worker.start()
+    return worker
+
+
+if __name__ == "__main__":
+    from models import init_db
+
+    parser = argparse.ArgumentParser(description="Pull new Spike data for due users into sqlite.")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    args = parser.parse_args()
+
+    init_db()
+    if args.once:
+        print(f"✅ Spike sync: {run_cycle()}")
+    else:
+        worker = start_background_sync()
+        try:
+            while worker.is_alive():
+                worker.join(1)
+        except KeyboardInterrupt:
+            worker.stop()
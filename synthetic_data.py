@@ -0,0 +1,186 @@
+"""
+Seeded, vectorized synthetic CGM and steps data.
+
+Builds months of 5- or 15-minute libre_glucose and fitbit_steps rows for
+thousands of users with numpy, one chunk of users at a time, and streams
+each chunk into the tables with executemany. Glucose keeps the shape
+seed_fake_libre always used: a ~90 mg/dL baseline, meal spikes of +25-40
+at 8:00, 13:00 and 19:00 decaying linearly over two hours, and +/-5 jitter.
+The same seed and chunk size always produce the same data.
+
+    python synthetic_data.py --users 10000 --days 90 --interval 5 --seed 42
+"""
+import argparse
+import secrets
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import Config
+
+MEALS = (8, 13, 19)                  # breakfast, lunch, dinner hour
+SPIKE_MINUTES = 120                  # linear decay back to baseline
+SPIKE_PEAK = (25, 40)                # mg/dL above baseline, inclusive
+JITTER = 5                           # +/- mg/dL per reading
+
+# Mean steps per 15 minutes for each hour of the day
+STEPS_PER_15MIN = np.array([
+    2, 1, 1, 1, 1, 5, 100, 400, 600, 300, 250, 250,
+    500, 300, 250, 250, 250, 500, 700, 400, 200, 100, 20, 10,
+], dtype=np.float64)
+
+
+class SlotGrid:
+    """Every `interval`-minute slot from start to end (inclusive), as stored strings and ts."""
+
+    def __init__(self, start: datetime, end: datetime, interval: int = 15):
+        from models import to_ts
+
+        first = to_ts(start)
+        count = int((end - start).total_seconds() // (interval * 60)) + 1
+        self.ts = first + np.arange(count, dtype=np.int64) * interval * 60
+        self.interval = interval
+        self.minute_of_day = (self.ts // 60) % 1440
+        self.day = self.ts // 86400 - first // 86400
+        stamps = np.datetime_as_string(self.ts.astype("datetime64[s]"), unit="m")
+        self.dates = [s[:10] for s in stamps]
+        self.times = [s[11:] for s in stamps]
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def glucose_values(rng, n_users: int, grid: SlotGrid, meals=MEALS, baseline: int = 90, baseline_spread: int = 0):
+    """
+    (n_users, len(grid)) int array of glucose readings. Each user gets one
+    spike per meal per day; baseline_spread varies the fasting level per user.
+    """
+    base = baseline
+    if baseline_spread:
+        base = baseline + rng.integers(-baseline_spread, baseline_spread + 1, size=(n_users, 1))
+    values = np.zeros((n_users, len(grid)), dtype=np.int64) + base
+
+    n_days = int(grid.day[-1]) + 1 if len(grid) else 0
+    for meal_hr in meals:
+        since = grid.minute_of_day - meal_hr * 60
+        in_spike = (since >= 0) & (since < SPIKE_MINUTES)
+        peak = rng.integers(SPIKE_PEAK[0], SPIKE_PEAK[1] + 1, size=(n_users, n_days))[:, grid.day[in_spike]]
+        decay = np.maximum(0, peak - since[in_spike] * (peak / SPIKE_MINUTES))
+        values[:, in_spike] += decay.astype(np.int64)
+
+    values += rng.integers(-JITTER, JITTER + 1, size=values.shape)
+    return values
+
+
+def steps_values(rng, n_users: int, grid: SlotGrid):
+    """(n_users, len(grid)) int array of step counts: Poisson around a daily profile, scaled per user."""
+    activity = rng.lognormal(0.0, 0.4, size=(n_users, 1))
+    lam = STEPS_PER_15MIN[grid.minute_of_day // 60] * (grid.interval / 15)
+    return rng.poisson(lam * activity)
+
+
+def ensure_users(conn, user_ids):
+    """Create placeholder accounts for synthetic users that do not exist yet (password: synthetic)."""
+    from models import hash_password
+
+    salt = secrets.token_hex(16)
+    pw_hash = hash_password("synthetic", salt)
+    with conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO users (user_id, name, email, dob, gender, password_hash, salt)
+            VALUES (?, ?, ?, '1980-01-01', 'Other', ?, ?)
+        """, [(uid, f"Synthetic {uid}", f"synthetic+{uid}@example.com", pw_hash, salt) for uid in user_ids])
+
+
+def write_chunk(conn, user_ids, grid: SlotGrid, glucose=None, steps=None):
+    """Bulk-insert one chunk of users in a single transaction. Returns rows inserted."""
+    n = len(user_ids)
+    uids = np.repeat(np.asarray(user_ids, dtype=np.int64), len(grid)).tolist()
+    dates = grid.dates * n
+    times = grid.times * n
+    ts = np.tile(grid.ts, n).tolist()
+
+    inserted = 0
+    with conn:
+        if glucose is not None:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT INTO libre_glucose (user_id, date, time, glucose, ts)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, date, time) DO NOTHING
+            """, zip(uids, dates, times, glucose.ravel().tolist(), ts))
+            inserted += conn.total_changes - before
+            # Cached grades for these users are stale now
+            conn.executemany("""
+                INSERT INTO grade_versions (user_id, version) VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+            """, [(int(uid),) for uid in user_ids])
+        if steps is not None:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT INTO fitbit_steps (user_id, date, time, steps, ts)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, date, time) DO NOTHING
+            """, zip(uids, dates, times, steps.ravel().tolist(), ts))
+            inserted += conn.total_changes - before
+    return inserted
+
+
+def populate(conn=None, users: int = 100, days: int = 30, interval: int = 15, seed: int = 0,
+             first_user_id: int = 1, chunk_users: int = 200, glucose: bool = True, steps: bool = True,
+             create_users: bool = True, baseline_spread: int = 20, end: datetime = None):
+    """
+    Generate and store `days` of data for `users` users, chunk_users at a
+    time so memory stays flat. Returns a summary dict with rows and rows/sec.
+    """
+    from models import get_conn, floor_to_15min
+
+    if conn is None:
+        conn = get_conn()
+    end = end or floor_to_15min(datetime.now())
+    grid = SlotGrid(end - timedelta(days=days), end, interval)
+
+    started = time.perf_counter()
+    rows = 0
+    for first in range(first_user_id, first_user_id + users, chunk_users):
+        user_ids = list(range(first, min(first + chunk_users, first_user_id + users)))
+        rng = np.random.default_rng([seed, first])
+        if create_users:
+            ensure_users(conn, user_ids)
+        g = glucose_values(rng, len(user_ids), grid, baseline_spread=baseline_spread) if glucose else None
+        s = steps_values(rng, len(user_ids), grid) if steps else None
+        rows += write_chunk(conn, user_ids, grid, g, s)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "users": users,
+        "slots_per_user": len(grid),
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from models import init_db
+
+    parser = argparse.ArgumentParser(description="Fill the database with seeded synthetic glucose and steps data.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, choices=(5, 15), default=15, help="minutes between readings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--chunk-users", type=int, default=200, help="users generated and inserted per transaction")
+    parser.add_argument("--no-steps", action="store_true")
+    parser.add_argument("--no-glucose", action="store_true")
+    parser.add_argument("--no-create-users", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    summary = populate(users=args.users, days=args.days, interval=args.interval, seed=args.seed,
+                       first_user_id=args.first_user_id, chunk_users=args.chunk_users,
+                       glucose=not args.no_glucose, steps=not args.no_steps,
+                       create_users=not args.no_create_users)
+    print(f"✅ Wrote {summary['rows']} rows for {summary['users']} users into {Config.DB_PATH} "
+          f"in {summary['seconds']}s ({summary['rows_per_sec']} rows/sec).")
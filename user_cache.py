@@ -0,0 +1,90 @@
+"""
+User profile cache.
+
+Holds only the display fields (PROFILE_FIELDS), never password_hash or
+salt. Entries live in a bounded in-process LRU for USER_CACHE_TTL seconds
+and are also memoized on flask.g, so a request that reads the profile
+several times hits the LRU once.
+
+Anything that changes a users row must call invalidate(user_id);
+create_user does.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_app_context
+
+from config import Config
+
+PROFILE_FIELDS = ("user_id", "name", "email", "dob", "gender", "created_at")
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # user_id -> (expires_at, profile)
+_stats = {"hits": 0, "misses": 0}
+
+
+def get(user_id: int):
+    """Return a copy of the cached profile dict, or None on a miss."""
+    if has_app_context():
+        profile = g.get("_user_profiles", {}).get(user_id)
+        if profile is not None:
+            return dict(profile)
+
+    now = time.time()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and entry[0] > now:
+            _entries.move_to_end(user_id)
+            _stats["hits"] += 1
+            profile = entry[1]
+        else:
+            _stats["misses"] += 1
+            profile = None
+
+    if profile is not None:
+        _remember(user_id, profile)
+        return dict(profile)
+    return None
+
+
+def put(user_id: int, row):
+    """Cache the display fields of a users row (sqlite3.Row or dict)."""
+    profile = {f: row[f] for f in PROFILE_FIELDS}
+    with _lock:
+        _entries[user_id] = (time.time() + Config.USER_CACHE_TTL, profile)
+        _entries.move_to_end(user_id)
+        while len(_entries) > Config.USER_CACHE_SIZE:
+            _entries.popitem(last=False)
+    _remember(user_id, profile)
+    return dict(profile)
+
+
+def invalidate(user_id: int):
+    with _lock:
+        _entries.pop(user_id, None)
+    if has_app_context():
+        g.get("_user_profiles", {}).pop(user_id, None)
+
+
+def _remember(user_id: int, profile: dict):
+    if has_app_context():
+        if "_user_profiles" not in g:
+            g._user_profiles = {}
+        g._user_profiles[user_id] = profile
+
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats, size=len(_entries))
+    lookups = s["hits"] + s["misses"]
+    s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+    return s
+
+
+def clear():
+    """Drop every in-process entry and reset the counters."""
+    with _lock:
+        _entries.clear()
+        for k in _stats:
+            _stats[k] = 0